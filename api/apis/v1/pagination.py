@@ -0,0 +1,67 @@
+from django.conf import settings
+from django.db.models import QuerySet
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+
+
+class KeysetPagination(BasePagination):
+    """
+    keyset (cursor) pagination of the v1 list endpoints.
+    a page is the rows after the key of the last row of the previous page (WHERE id > cursor ORDER BY id LIMIT n),
+    so a deep page is an index range like the first one and never an OFFSET scan.
+    works on querysets and on lists already ordered by the key (cached listings).
+    """
+    key = 'id'
+    descending = False
+    cursor_query_param = 'cursor'
+    limit_query_param = 'limit'
+    max_limit = 1000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.limit = self.get_limit(request)
+        cursor = self.get_cursor(request)
+
+        #one extra row tells if there is a next page
+        if isinstance(queryset, QuerySet):
+            if cursor is not None:
+                queryset = queryset.filter(**{f"{self.key}__{'lt' if self.descending else 'gt'}": cursor})
+            rows = list(queryset.order_by(f"-{self.key}" if self.descending else self.key)[:self.limit + 1])
+        else:
+            rows = [row for row in queryset if cursor is None or self._is_after(self._get_key(row), cursor)][:self.limit + 1]
+
+        self.next_cursor = self._get_key(rows[self.limit - 1]) if len(rows) > self.limit else None
+        return rows[:self.limit]
+
+    def get_paginated_response(self, data):
+        return Response({
+            "results": data,
+            "next_cursor": self.next_cursor
+        })
+
+    def get_limit(self, request) -> int:
+        try:
+            limit = int(request.query_params[self.limit_query_param])
+        except (KeyError, ValueError):
+            return settings.API_PAGE_SIZE
+        return min(max(limit, 1), self.max_limit)
+
+    def get_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor is None:
+            return None
+        try:
+            return int(cursor)
+        except ValueError:
+            raise NotFound("Invalid cursor.")
+
+    def _is_after(self, key, cursor) -> bool:
+        return key < cursor if self.descending else key > cursor
+
+    def _get_key(self, row):
+        return row[self.key] if isinstance(row, dict) else getattr(row, self.key)
+
+
+class NewestFirstKeysetPagination(KeysetPagination):
+    # newest rows first (WHERE id < cursor ORDER BY id DESC)
+    descending = True
@@ -0,0 +1,20 @@
+from rest_framework import serializers
+from currencies.registry import market_registry
+from orders.models import Candle
+
+class CandleSerializer(serializers.Serializer):
+    market_symbol = serializers.CharField(max_length=17)
+    interval = serializers.ChoiceField(choices=Candle.Interval.choices, default=Candle.Interval.ONE_MINUTE)
+    start = serializers.DateTimeField(required=False)
+    end = serializers.DateTimeField(required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=1000, default=500)
+
+    def validate_market_symbol(self, value):
+        if not market_registry.exists(value):
+            raise serializers.ValidationError(f"Market {value} does not exist.")
+        return value
+
+    def validate(self, data):
+        if data.get('start') and data.get('end') and data['start'] >= data['end']:
+            raise serializers.ValidationError("start must be before end.")
+        return data
@@ -7,7 +7,7 @@ class MarketSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Market
-        fields = ['id', 'base_currency', 'quote_currency', 'fee']
+        fields = ['id', 'base_currency', 'quote_currency', 'fee', 'tick_size', 'lot_size']
 
     def validate(self, data):
         if data['base_currency'] == data['quote_currency']:
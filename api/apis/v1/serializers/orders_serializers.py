@@ -1,6 +1,26 @@
+from decimal import Decimal
 from rest_framework import serializers
+from django.conf import settings
 from orders.models import Order
-from  currencies.models import Market
+from currencies.registry import market_registry
+
+
+
+class OrderBatchCreateSerializer(serializers.ListSerializer):
+    """
+    list of new orders (OrderCreateSerializer(many=True)) , saved with one bulk insert
+    """
+
+    def validate(self, attrs):
+        if not attrs:
+            raise serializers.ValidationError("The batch is empty.")
+        if len(attrs) > settings.ORDER_BATCH_MAX_SIZE:
+            raise serializers.ValidationError(f"A batch can have at most {settings.ORDER_BATCH_MAX_SIZE} orders.")
+        return attrs
+
+    def create(self, validated_data):
+        #the ids are returned by the insert , in the order of the list
+        return Order.objects.bulk_create([Order(**attrs) for attrs in validated_data])
 
 
 
@@ -10,15 +30,40 @@ class OrderCreateSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Order
+        list_serializer_class = OrderBatchCreateSerializer
         fields = ['id', 'target_market', 'order_type', 'order_side', 'price', 'amount', 'order_state', 'filled_amount', 'created_at', 'updated_at', 'filled_at']
         read_only_fields = ['id', 'order_state', 'filled_amount', 'created_at', 'updated_at', 'filled_at']
 
     def validate_target_market(self, value):
-        try:
-            market = Market.objects.get(symbol=value)
-            return market
-        except Market.DoesNotExist:
+        market = market_registry.get(value)
+        if market is None:
             raise serializers.ValidationError(f"Market {value} does not exist.")
+        return market.as_market()
+
+    def validate(self, attrs):
+        market = market_registry.get_by_id(attrs['target_market'].id)
+        validate_steps(market.scale, attrs.get('price'), attrs.get('amount'))
+        return attrs
+
+
+
+def validate_steps(scale, price=None, amount=None):
+    """
+    the engine books hold prices and amounts as integers of the market tick and lot size
+    """
+    errors = {}
+    try:
+        if price is not None:
+            scale.to_ticks(price)
+    except ValueError as e:
+        errors['price'] = str(e)
+    try:
+        if amount is not None:
+            scale.to_lots(amount)
+    except ValueError as e:
+        errors['amount'] = str(e)
+    if errors:
+        raise serializers.ValidationError(errors)
 
 
 
@@ -30,4 +75,114 @@ class CancelOrderSerializer(serializers.Serializer):
             order = Order.objects.get(id=value, order_state__in=[Order.OrderState.WAITING, Order.OrderState.PARTIALLY_FILLED])
             return order
         except Order.DoesNotExist:
-            raise serializers.ValidationError(f"Order {value} is not valid or cannot be canceled.")
\ No newline at end of file
+            raise serializers.ValidationError(f"Order {value} is not valid or cannot be canceled.")
+
+
+class AmendOrderSerializer(serializers.Serializer):
+    order_id = serializers.IntegerField()
+    # same precision as the order columns , the tick / lot grid of the market is checked in validate
+    price = serializers.DecimalField(max_digits=40, decimal_places=16, min_value=Decimal('0.000000000001'), required=False)
+    amount = serializers.DecimalField(max_digits=32, decimal_places=8, min_value=Decimal('0.000000000001'), required=False)
+
+    def validate_order_id(self, value):
+        try:
+            return Order.objects.get(
+                id=value,
+                order_type=Order.OrderType.LIMIT,
+                order_state__in=[Order.OrderState.WAITING, Order.OrderState.PARTIALLY_FILLED]
+            )
+        except Order.DoesNotExist:
+            raise serializers.ValidationError(f"Order {value} is not valid or cannot be amended.")
+
+    def validate(self, attrs):
+        if 'price' not in attrs and 'amount' not in attrs:
+            raise serializers.ValidationError("Send a new price and/or amount.")
+        order = attrs['order_id']
+        if 'amount' in attrs and attrs['amount'] <= (order.filled_amount or 0):
+            raise serializers.ValidationError({"amount": "Amount must be greater than the filled amount."})
+        validate_steps(market_registry.get_by_id(order.target_market_id).scale, attrs.get('price'), attrs.get('amount'))
+        return attrs
+
+
+
+class BulkCancelOrderSerializer(serializers.Serializer):
+    """
+    cancel a list of orders (order_ids) , or every resting order of a market (market_symbol , optionally one order_side)
+    """
+    order_ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False)
+    market_symbol = serializers.CharField(required=False)
+    order_side = serializers.ChoiceField(choices=Order.OrderSide.choices, required=False)
+
+    def validate_order_ids(self, value):
+        if len(value) > settings.ORDER_BATCH_MAX_SIZE:
+            raise serializers.ValidationError(f"At most {settings.ORDER_BATCH_MAX_SIZE} orders can be canceled at once.")
+        return value
+
+    def validate_market_symbol(self, value):
+        market = market_registry.get(value)
+        if market is None:
+            raise serializers.ValidationError(f"Market {value} does not exist.")
+        return market
+
+    def validate(self, attrs):
+        if ('order_ids' in attrs) == ('market_symbol' in attrs):
+            raise serializers.ValidationError("Send either order_ids or market_symbol.")
+        if 'order_ids' in attrs:
+            if 'order_side' in attrs:
+                raise serializers.ValidationError("order_side can only be used with market_symbol.")
+            #group the cancelable orders by market , one engine command per market
+            markets = {}
+            cancelable = Order.objects.filter(
+                id__in=attrs['order_ids'],
+                order_state__in=[Order.OrderState.WAITING, Order.OrderState.PARTIALLY_FILLED]
+            ).values_list('id', 'target_market_id')
+            for order_id, market_id in cancelable:
+                markets.setdefault(market_id, []).append(order_id)
+            if not markets:
+                raise serializers.ValidationError("None of the orders can be canceled.")
+            attrs['targets'] = list(markets.items())
+        else:
+            attrs['targets'] = [(attrs['market_symbol'].id, None)]
+        return attrs
+
+
+
+class OrderSerializer(serializers.ModelSerializer):
+    """
+    read only order , the market symbol comes from the market registry (no join)
+    """
+    target_market = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Order
+        fields = ['id', 'target_market', 'order_type', 'order_side', 'price', 'amount', 'order_state', 'filled_amount', 'remaining_amount', 'created_at', 'updated_at', 'filled_at']
+        read_only_fields = fields
+
+    def get_target_market(self, obj):
+        return market_registry.get_by_id(obj.target_market_id).symbol
+
+
+
+class OrderListFilterSerializer(serializers.Serializer):
+    market_symbol = serializers.CharField(required=False)
+    order_side = serializers.ChoiceField(choices=Order.OrderSide.choices, required=False)
+    order_state = serializers.ChoiceField(choices=Order.OrderState.choices, required=False)
+
+    def validate_market_symbol(self, value):
+        market = market_registry.get(value)
+        if market is None:
+            raise serializers.ValidationError(f"Market {value} does not exist.")
+        return market
+
+
+
+class OpenOrderListSerializer(serializers.Serializer):
+    market_symbol = serializers.CharField()
+    limit = serializers.IntegerField(min_value=1, max_value=1000, default=100)
+    # id of the last order of the previous page
+    cursor = serializers.IntegerField(min_value=1, required=False)
+
+    def validate_market_symbol(self, value):
+        if not market_registry.exists(value):
+            raise serializers.ValidationError(f"Market {value} does not exist.")
+        return value
@@ -0,0 +1,10 @@
+from rest_framework import serializers
+from currencies.registry import market_registry
+
+class TickerSerializer(serializers.Serializer):
+    market_symbol = serializers.CharField(max_length=17)
+
+    def validate_market_symbol(self, value):
+        if not market_registry.exists(value):
+            raise serializers.ValidationError(f"Market {value} does not exist.")
+        return value
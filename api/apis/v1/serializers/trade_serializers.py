@@ -0,0 +1,13 @@
+from rest_framework import serializers
+from currencies.registry import market_registry
+
+class RecentTradesSerializer(serializers.Serializer):
+    market_symbol = serializers.CharField(max_length=17)
+    limit = serializers.IntegerField(min_value=1, max_value=1000, default=100)
+    # id of the last trade of the previous page
+    cursor = serializers.IntegerField(min_value=1, required=False)
+
+    def validate_market_symbol(self, value):
+        if not market_registry.exists(value):
+            raise serializers.ValidationError(f"Market {value} does not exist.")
+        return value
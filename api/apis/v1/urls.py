@@ -1,13 +1,24 @@
 
 from django.urls import path
 from api.apis.v1.views.market_views import MarketListCreateView
-from api.apis.v1.views.orders_views import OrderCreateUpdateView
+from api.apis.v1.views.orders_views import OrderCreateUpdateView , OrderBatchCreateUpdateView , OrderListView , OrderDetailView , OpenOrderListView
 from api.apis.v1.views.order_book_views import OrderBookView
+from api.apis.v1.views.candle_views import CandleView
+from api.apis.v1.views.ticker_views import TickerView , TickerListView
+from api.apis.v1.views.trade_views import RecentTradesView
 
 app_name = "api"
 
 urlpatterns = [
     path("market/", MarketListCreateView.as_view(), name="market"),
     path("order/", OrderCreateUpdateView.as_view(), name="order"),
+    path("order/batch/", OrderBatchCreateUpdateView.as_view(), name="order-batch"),
+    path("order/<int:order_id>/", OrderDetailView.as_view(), name="order-detail"),
+    path("orders/", OrderListView.as_view(), name="orders"),
+    path("orders/open/", OpenOrderListView.as_view(), name="orders-open"),
     path("order-book/", OrderBookView.as_view(), name="orderbook"),
+    path("candles/", CandleView.as_view(), name="candles"),
+    path("ticker/", TickerView.as_view(), name="ticker"),
+    path("tickers/", TickerListView.as_view(), name="tickers"),
+    path("trades/", RecentTradesView.as_view(), name="trades"),
 ]
\ No newline at end of file
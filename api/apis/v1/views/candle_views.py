@@ -0,0 +1,27 @@
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+from orders.candles import candle_service
+from ..serializers.candle_serializers import CandleSerializer
+
+class CandleView(APIView):
+    def get(self, request):
+        serializer = CandleSerializer(data=request.query_params)
+        if serializer.is_valid():
+            market_symbol = serializer.validated_data['market_symbol']
+            interval = serializer.validated_data['interval']
+            
+            # closed bars from the candle table and the open bar from redis , Trade is never read
+            candles = candle_service.get_candles(
+                market_symbol=market_symbol,
+                interval=interval,
+                start=serializer.validated_data.get('start'),
+                end=serializer.validated_data.get('end'),
+                limit=serializer.validated_data['limit']
+            )
+            return Response({
+                "market_symbol": market_symbol,
+                "interval": interval,
+                "candles": candles
+            }, status=status.HTTP_200_OK)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
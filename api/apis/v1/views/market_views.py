@@ -1,9 +1,24 @@
 from rest_framework import generics
 from currencies.models import Market
+from currencies.registry import market_registry
+from orders.sharding import shard_router
 from ..serializers.market_serializers import MarketSerializer
+from ..pagination import KeysetPagination
 
 
 class MarketListCreateView(generics.ListCreateAPIView):
     # Get list of Market and create new
     queryset = Market.objects.all()
     serializer_class = MarketSerializer
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        if self.request.method == 'GET':
+            # served from the in-process market registry , a create invalidates it in every process (currencies/signals.py)
+            return [market.as_market() for market in market_registry.all()]
+        return super().get_queryset()
+
+    def perform_create(self, serializer):
+        market = serializer.save()
+        # let the matcher shards rebalance so the owning shard picks the new market up
+        shard_router.assign_market(market.symbol)
@@ -1,3 +1,4 @@
+from django.utils.http import parse_etags
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
@@ -8,9 +9,36 @@ class OrderBookView(APIView):
     def get(self, request):
         serializer = OrderBookSerializer(data=request.query_params)
         if serializer.is_valid():
-            order_book = order_book_service.get_order_book(
-                market_symbol=serializer.validated_data['market_symbol'],
-                limit=serializer.validated_data['limit']
+            market_symbol = serializer.validated_data['market_symbol']
+            limit = serializer.validated_data['limit']
+            
+            # unchanged book: one redis MGET and no body
+            if_none_match = request.headers.get('If-None-Match')
+            if if_none_match:
+                etag = self._get_etag(*order_book_service.get_version(market_symbol), limit)
+                if self._etag_matches(if_none_match, etag):
+                    return self._with_cache_headers(Response(status=status.HTTP_304_NOT_MODIFIED), etag)
+            
+            order_book = order_book_service.get_cached_order_book(
+                market_symbol=market_symbol,
+                limit=limit
             )
-            return Response(order_book, status=status.HTTP_200_OK)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+            response = Response(order_book, status=status.HTTP_200_OK)
+            if "sequence" in order_book:
+                self._with_cache_headers(response, self._get_etag(order_book.get("epoch"), order_book["sequence"], limit))
+            return response
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    def _get_etag(self, epoch: str, sequence: int, limit: int) -> str:
+        return f'"{epoch}-{sequence}-{limit}"'
+    
+    def _etag_matches(self, if_none_match: str, etag: str) -> bool:
+        #a list of tags , weak comparison (W/ is ignored) , '*' matches any book
+        etags = parse_etags(if_none_match)
+        return '*' in etags or etag in [tag[2:] if tag.startswith('W/') else tag for tag in etags]
+    
+    def _with_cache_headers(self, response, etag):
+        #clients and proxies may keep the book but must revalidate it every time
+        response['ETag'] = etag
+        response['Cache-Control'] = 'no-cache'
+        return response
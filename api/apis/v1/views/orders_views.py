@@ -1,31 +1,151 @@
-from rest_framework import status
+from rest_framework import status, generics
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from ..serializers.orders_serializers import OrderCreateSerializer , CancelOrderSerializer
+from ..serializers.orders_serializers import OrderCreateSerializer , CancelOrderSerializer , AmendOrderSerializer , BulkCancelOrderSerializer , OrderSerializer , OrderListFilterSerializer , OpenOrderListSerializer
+from ..pagination import NewestFirstKeysetPagination
+from orders.models import Order
 from django.db import transaction
 from orders.services import engine
+from orders.ingestion import order_ingestion
+from orders.status_cache import order_status_cache
 
 
 class OrderCreateUpdateView(APIView):
-    # Create a new order and change order state to cancel
+    # Create a new order , amend its price / amount and change order state to cancel
 
     def post(self, request):
             serializer = OrderCreateSerializer(data=request.data)
             if serializer.is_valid():
                 with transaction.atomic():
                     order = serializer.save()
+                    if order_ingestion.is_async():
+                        # the matcher picks the order up once the row is committed
+                        transaction.on_commit(lambda: order_ingestion.enqueue_order(order))
+                        return Response({"order_id": order.id, "status": "queued"}, status=status.HTTP_202_ACCEPTED)
                     engine.process_order(order.id) 
                     return Response({"order_id": order.id, "status": "created"}, status=status.HTTP_201_CREATED)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
+    def put(self, request):
+        serializer = AmendOrderSerializer(data=request.data)
+        if serializer.is_valid():
+            order = serializer.validated_data['order_id']
+            price = serializer.validated_data.get('price')
+            amount = serializer.validated_data.get('amount')
+            if order_ingestion.is_async():
+                # amends are queued like cancels so they are applied in order with the matching
+                order_ingestion.enqueue_amend(order, price, amount)
+                return Response({"order_id": order.id, "status": "amend_queued"}, status=status.HTTP_202_ACCEPTED)
+            result = engine.amend_order(order.id, price, amount)
+            if result["status"] == "error":
+                return Response(result, status=status.HTTP_400_BAD_REQUEST)
+            return Response(dict(result, order_id=order.id, status="amended"), status=status.HTTP_200_OK)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
     def patch(self, request):
-        print(request.data)
         serializer = CancelOrderSerializer(data=request.data)
         if serializer.is_valid():
+            order = serializer.validated_data['order_id']
+            if order_ingestion.is_async():
+                # cancels go through the same queue so they are applied in order with the matching
+                order_ingestion.enqueue_cancel(order)
+                return Response({"order_id": order.id, "status": "cancel_queued"}, status=status.HTTP_202_ACCEPTED)
+            # the engine also writes the order status cache and the journal
+            result = engine.cancel_order(order.id)
+            if result["status"] == "error":
+                return Response(result, status=status.HTTP_400_BAD_REQUEST)
+            return Response({"order_id": order.id, "status": "canceled"}, status=status.HTTP_200_OK)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+
+class OrderBatchCreateUpdateView(APIView):
+    # Create a list of orders with one insert and match them in arrival order , cancel many orders at once
+
+    def post(self, request):
+        serializer = OrderCreateSerializer(data=request.data, many=True)
+        if serializer.is_valid():
+            with transaction.atomic():
+                orders = serializer.save()
+                if order_ingestion.is_async():
+                    transaction.on_commit(lambda: order_ingestion.enqueue_orders(orders))
+                    return Response(
+                        [{"order_id": order.id, "status": "queued"} for order in orders],
+                        status=status.HTTP_202_ACCEPTED
+                    )
+                results = engine.process_orders([order.id for order in orders])
+                return Response(
+                    [dict(result, order_id=order.id) for order, result in zip(orders, results)],
+                    status=status.HTTP_201_CREATED
+                )
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    def patch(self, request):
+        serializer = BulkCancelOrderSerializer(data=request.data)
+        if serializer.is_valid():
+            targets = serializer.validated_data['targets']
+            side = serializer.validated_data.get('order_side')
+            if order_ingestion.is_async():
+                for market_id, order_ids in targets:
+                    order_ingestion.enqueue_cancel_orders(market_id, order_ids, side)
+                return Response({"status": "cancel_queued"}, status=status.HTTP_202_ACCEPTED)
+            # all markets are canceled in one transaction , a failing market rolls back the others
+            # and drops their in-memory books (they are rebuilt from postgres on the next command)
+            canceled = []
             with transaction.atomic():
-                order = serializer.validated_data['order_id']
-                order.order_state = 'canceled'
-                order.save()
-                engine._update_order_book(order)
-                return Response({"order_id": order.id, "status": "canceled"}, status=status.HTTP_200_OK)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+                for index, (market_id, order_ids) in enumerate(targets):
+                    result = engine.cancel_orders(market_id, order_ids, side)
+                    if result["status"] == "error":
+                        transaction.set_rollback(True)
+                        for done_market_id, _ in targets[:index]:
+                            engine.books.pop(done_market_id, None)
+                        return Response(result, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+                    canceled.extend(result["order_ids"])
+            return Response({"order_ids": canceled, "status": "canceled"}, status=status.HTTP_200_OK)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+
+class OrderListView(generics.ListAPIView):
+    # List orders newest first , filtered by market , side and state , keyset paginated
+    serializer_class = OrderSerializer
+    pagination_class = NewestFirstKeysetPagination
+
+    def get_queryset(self):
+        filters = OrderListFilterSerializer(data=self.request.query_params)
+        filters.is_valid(raise_exception=True)
+        queryset = Order.objects.all()
+        if 'market_symbol' in filters.validated_data:
+            queryset = queryset.filter(target_market_id=filters.validated_data['market_symbol'].id)
+        if 'order_side' in filters.validated_data:
+            queryset = queryset.filter(order_side=filters.validated_data['order_side'])
+        if 'order_state' in filters.validated_data:
+            queryset = queryset.filter(order_state=filters.validated_data['order_state'])
+        return queryset
+
+
+
+class OrderDetailView(APIView):
+    # Status , amounts and fills of one order from the order status cache (postgres on a miss)
+
+    def get(self, request, order_id):
+        order = order_status_cache.get_order(order_id)
+        if order is None:
+            return Response({"message": "Order not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(order, status=status.HTTP_200_OK)
+
+
+
+class OpenOrderListView(APIView):
+    # Open orders of a market newest first , from the order status cache , keyset paginated
+
+    def get(self, request):
+        serializer = OpenOrderListSerializer(data=request.query_params)
+        if serializer.is_valid():
+            orders, next_cursor = order_status_cache.get_open_orders(
+                serializer.validated_data['market_symbol'],
+                limit=serializer.validated_data['limit'],
+                cursor=serializer.validated_data.get('cursor')
+            )
+            return Response({"results": orders, "next_cursor": next_cursor}, status=status.HTTP_200_OK)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,19 @@
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+from orders.tickers import ticker_service
+from ..serializers.ticker_serializers import TickerSerializer
+
+class TickerView(APIView):
+    def get(self, request):
+        serializer = TickerSerializer(data=request.query_params)
+        if serializer.is_valid():
+            # rolling 24h statistics and top of book , one redis hash read
+            ticker = ticker_service.get_ticker(serializer.validated_data['market_symbol'])
+            return Response(ticker, status=status.HTTP_200_OK)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+class TickerListView(APIView):
+    def get(self, request):
+        # every market from the same hash
+        return Response(ticker_service.get_tickers(), status=status.HTTP_200_OK)
@@ -0,0 +1,32 @@
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+from orders.tape import trade_tape
+from ..serializers.trade_serializers import RecentTradesSerializer
+from ..pagination import NewestFirstKeysetPagination
+
+class RecentTradesView(APIView):
+    pagination_class = NewestFirstKeysetPagination
+
+    def get(self, request):
+        serializer = RecentTradesSerializer(data=request.query_params)
+        if serializer.is_valid():
+            market_symbol = serializer.validated_data['market_symbol']
+            limit = serializer.validated_data['limit']
+            
+            # first page from the redis tape
+            trades = [] if 'cursor' in serializer.validated_data else trade_tape.get_recent_trades(market_symbol, limit)
+            if trades:
+                next_cursor = trades[-1]['id'] if len(trades) == limit else None
+            else:
+                # next pages (or an empty tape) by keyset on Trade
+                paginator = self.pagination_class()
+                page = paginator.paginate_queryset(trade_tape.get_trade_rows(market_symbol), request, self)
+                trades = [trade_tape.get_row_data(row) for row in page]
+                next_cursor = paginator.next_cursor
+            return Response({
+                "market_symbol": market_symbol,
+                "trades": trades,
+                "next_cursor": next_cursor
+            }, status=status.HTTP_200_OK)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,27 @@
+import redis
+from django.conf import settings
+
+_pool = None
+
+
+def get_redis_pool() -> redis.ConnectionPool:
+    """
+    process wide connection pool built from settings.REDIS_URL.
+    redis-py resets the pool after a fork, so forked matcher shards get their own connections.
+    """
+    global _pool
+    if _pool is None:
+        _pool = redis.ConnectionPool.from_url(
+            settings.REDIS_URL,
+            password=settings.REDIS_PASSWORD,
+            max_connections=settings.REDIS_MAX_CONNECTIONS,
+            decode_responses=True,
+        )
+    return _pool
+
+
+def get_redis_client() -> redis.Redis:
+    """
+    redis client on the shared pool , every service singleton uses one of these.
+    """
+    return redis.Redis(connection_pool=get_redis_pool())
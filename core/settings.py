@@ -55,7 +55,7 @@ INSTALLED_APPS = [
 
     # Third-party apps
     'rest_framework',
-    # 'channels',
+    'channels',
 
 ]
 
@@ -88,6 +88,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'core.wsgi.application'
+ASGI_APPLICATION = 'core.asgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
@@ -159,6 +160,39 @@ REDIS_PORT=env('REDIS_PORT')
 REDIS_DB=env('REDIS_DB')
 REDIS_PASSWORD = None  
 REDIS_URL = f'redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_DB}'
+#connections of the pool shared by every redis client of a process (core/redis_pool.py)
+REDIS_MAX_CONNECTIONS = env.int('REDIS_MAX_CONNECTIONS', default=50)
+
+#order ingestion: 'sync' matches inside the api request,
+#'async' queues orders to a Redis stream consumed by `manage.py run_matcher`
+ORDER_INGESTION_MODE = env('ORDER_INGESTION_MODE', default='sync')
+MATCHER_BLOCK_MS = env.int('MATCHER_BLOCK_MS', default=100)
+#max orders of one /order/batch/ request
+ORDER_BATCH_MAX_SIZE = env.int('ORDER_BATCH_MAX_SIZE', default=500)
+#seconds a closed order stays in the order status cache (open orders never expire)
+ORDER_STATUS_TTL = env.int('ORDER_STATUS_TTL', default=86400)
+#default page size of the keyset paginated list endpoints (api/apis/v1/pagination.py)
+API_PAGE_SIZE = env.int('API_PAGE_SIZE', default=100)
+#recent trades kept per market in the redis tape served by /trades/
+TRADE_TAPE_SIZE = env.int('TRADE_TAPE_SIZE', default=1000)
+#number of matcher worker processes , markets are spread over them by consistent hash
+MATCHER_SHARDS = env.int('MATCHER_SHARDS', default=1)
+#seconds the lock of a matcher shard outlives its holder , the matcher extends it on every loop
+MATCHER_LOCK_TIMEOUT = env.int('MATCHER_LOCK_TIMEOUT', default=10)
+#lock maker rows with SELECT ... FOR UPDATE SKIP LOCKED instead of matching against the
+#in-memory book, so several sync api workers can match the same market concurrently
+MATCHING_ROW_LOCKS = env.bool('MATCHING_ROW_LOCKS', default=False)
+#write-ahead journal of the matcher shards (one sub directory per shard) , empty disables it
+MATCHING_JOURNAL_DIR = env('MATCHING_JOURNAL_DIR', default='')
+JOURNAL_SEGMENT_SIZE = env.int('JOURNAL_SEGMENT_SIZE', default=64 * 1024 * 1024)
+#msync the segment after every append (survives an os crash , not only a process crash)
+JOURNAL_FSYNC = env.bool('JOURNAL_FSYNC', default=False)
+#seconds between two snapshots of the books of a shard , and how many snapshot files are kept
+ENGINE_SNAPSHOT_INTERVAL = env.int('ENGINE_SNAPSHOT_INTERVAL', default=60)
+ENGINE_SNAPSHOTS_KEPT = env.int('ENGINE_SNAPSHOTS_KEPT', default=2)
+#seconds between two checks of the market registry version key in Redis
+#(local Market saves invalidate the registry immediately)
+MARKET_REGISTRY_CHECK_INTERVAL = env.float('MARKET_REGISTRY_CHECK_INTERVAL', default=1.0)
 
 
 # #celery configs
@@ -174,12 +208,16 @@ REDIS_URL = f'redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_DB}'
 #     },
 # }
 
-#channel configs
-# CHANNEL_LAYERS = {
-#     'default': {
-#         'BACKEND': 'channels_redis.core.RedisChannelLayer',
-#         'CONFIG': {
-#             'hosts': [('127.0.0.1', 6379)],
-#         },
-#     },
-# }
+#channel configs , order book websocket streams fan out through this layer
+CHANNEL_LAYERS = {
+    'default': {
+        'BACKEND': 'channels_redis.core.RedisChannelLayer',
+        'CONFIG': {
+            'hosts': [REDIS_URL],
+        },
+    },
+}
+#price levels per side in the snapshot sent to websocket subscribers
+ORDER_BOOK_STREAM_DEPTH = env.int('ORDER_BOOK_STREAM_DEPTH', default=100)
+#seconds a cached order book snapshot is kept (it is only served while its sequence is current)
+ORDER_BOOK_SNAPSHOT_TTL = env.int('ORDER_BOOK_SNAPSHOT_TTL', default=60)
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.18 on 2026-10-18 04:05
+
+from decimal import Decimal
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('currencies', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='market',
+            name='lot_size',
+            field=models.DecimalField(decimal_places=8, default=Decimal('1E-8'), max_digits=24, validators=[django.core.validators.MinValueValidator(Decimal('1E-8'))]),
+        ),
+        migrations.AddField(
+            model_name='market',
+            name='tick_size',
+            field=models.DecimalField(decimal_places=8, default=Decimal('1E-8'), max_digits=24, validators=[django.core.validators.MinValueValidator(Decimal('1E-8'))]),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.18 on 2026-10-18 04:35
+
+from decimal import Decimal
+import django.core.validators
+from django.db import migrations, models
+
+
+def fit_tick_sizes(apps, schema_editor):
+    #orders priced finer than the default tick (the price column has 16 decimal places) were accepted before tick sizes ,
+    #such a market gets the power of ten tick that holds all its prices so its book still loads
+    Market = apps.get_model('currencies', 'Market')
+    Order = apps.get_model('orders', 'Order')
+    for market in Market.objects.all():
+        places = None
+        for price in Order.objects.filter(target_market_id=market.id).values_list('price', flat=True).distinct().iterator():
+            if price % market.tick_size:
+                places = max(places or 0, -price.normalize().as_tuple().exponent)
+        if places is not None:
+            places = max(places, -market.tick_size.normalize().as_tuple().exponent)
+            Market.objects.filter(id=market.id).update(tick_size=Decimal(1).scaleb(-places))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('currencies', '0002_market_tick_lot_size'),
+        ('orders', '0007_order_resting_bid_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='market',
+            name='tick_size',
+            field=models.DecimalField(decimal_places=16, default=Decimal('1E-8'), max_digits=32, validators=[django.core.validators.MinValueValidator(Decimal('1E-16'))]),
+        ),
+        migrations.RunPython(fit_tick_sizes, migrations.RunPython.noop),
+    ]
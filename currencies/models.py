@@ -1,8 +1,10 @@
+from django.apps import apps
 from django.db import models
 from core.models import BaseModel
 from django.core.validators import MinValueValidator
 from django.core.exceptions import ValidationError
 from decimal import Decimal
+from orders.fixed import FixedPoint
 
 class Currency(models.Model):
     # currency models for handle define new currency without edit code from django admin safely
@@ -26,6 +28,10 @@ class Market(BaseModel):
     quote_currency = models.ForeignKey('currencies.Currency',on_delete=models.DO_NOTHING, null=True,related_name ='market_quote_currency')
     state = models.CharField(choices=STATUS_CHOICES, max_length=15, default='Active')
     fee = models.DecimalField(max_digits=10, decimal_places=9, default=0, validators=[MinValueValidator(Decimal('0.000000001'))])
+    # price step and amount step of the orders , the engine books hold prices and amounts as integer multiples of them
+    # (as fine as the order price / amount columns , 16 and 8 decimal places)
+    tick_size = models.DecimalField(max_digits=32, decimal_places=16, default=Decimal('0.00000001'), validators=[MinValueValidator(Decimal('0.0000000000000001'))])
+    lot_size = models.DecimalField(max_digits=24, decimal_places=8, default=Decimal('0.00000001'), validators=[MinValueValidator(Decimal('0.00000001'))])
     
     def __str__(self):
         return self.symbol
@@ -45,4 +51,27 @@ class Market(BaseModel):
             self.symbol = self.get_symbol()
             if self.base_currency == self.quote_currency:
                 raise ValidationError("Cant create market with same base and quote currency.!")
-            super().save(*args, **kwargs)
\ No newline at end of file
+            if self.pk:
+                self.check_resting_orders()
+            super().save(*args, **kwargs)
+
+    def check_resting_orders(self):
+        """
+        refuse a new tick / lot size that puts a resting order off the grid , the engine could not load the book.
+        """
+        current = Market.objects.filter(pk=self.pk).values_list('tick_size', 'lot_size').first()
+        if current is None or current == (self.tick_size, self.lot_size):
+            return
+        scale = FixedPoint(self.tick_size, self.lot_size)
+        resting = apps.get_model('orders', 'Order').objects.filter(
+            target_market_id=self.pk,
+            order_state__in=['waiting', 'partially_filled'],
+            remaining_amount__gt=0
+        ).values_list('id', 'price', 'filled_amount', 'remaining_amount')
+        for order_id, price, filled_amount, remaining_amount in resting.iterator():
+            try:
+                scale.to_ticks(price)
+                scale.to_lots(filled_amount or Decimal('0'))
+                scale.to_lots(remaining_amount)
+            except ValueError as e:
+                raise ValidationError(f"Resting order {order_id} is off the new grid: {e}")
\ No newline at end of file
@@ -0,0 +1,146 @@
+import time
+from django.conf import settings
+from django.db import transaction
+from currencies.models import Market
+from orders.fixed import FixedPoint
+from core.redis_pool import get_redis_client
+
+
+class MarketInfo:
+    """
+    read-only market metadata kept in memory by the registry.
+    """
+    __slots__ = (
+        'id', 'symbol', 'fee', 'state', 'base_currency', 'quote_currency', 'base_currency_id', 'quote_currency_id', 'scale'
+    )
+
+    def __init__(self, id, symbol, fee, state, base_currency, quote_currency, base_currency_id=None, quote_currency_id=None, scale=None):
+        self.id = id
+        self.symbol = symbol
+        self.fee = fee
+        self.state = state
+        self.base_currency = base_currency
+        self.quote_currency = quote_currency
+        self.base_currency_id = base_currency_id
+        self.quote_currency_id = quote_currency_id
+        #fixed-point scale (tick size , lot size) of the engine books
+        self.scale = scale
+
+    @classmethod
+    def from_market(cls, market: Market):
+        return cls(
+            id=market.id,
+            symbol=market.symbol,
+            fee=market.fee,
+            state=market.state,
+            base_currency=market.base_currency.symbol if market.base_currency else None,
+            quote_currency=market.quote_currency.symbol if market.quote_currency else None,
+            base_currency_id=market.base_currency_id,
+            quote_currency_id=market.quote_currency_id,
+            scale=FixedPoint(market.tick_size, market.lot_size),
+        )
+
+    def as_market(self) -> Market:
+        """
+        Market instance built from the cached fields without a query (other fields are deferred).
+        """
+        return Market.from_db(
+            None,
+            ['id', 'symbol', 'fee', 'state', 'base_currency_id', 'quote_currency_id', 'tick_size', 'lot_size'],
+            [
+                self.id, self.symbol, self.fee, self.state, self.base_currency_id, self.quote_currency_id,
+                self.scale.tick_size, self.scale.lot_size
+            ],
+        )
+
+
+class MarketRegistry:
+    """
+    in-process cache of every market (symbol / id -> MarketInfo).
+    the whole table is loaded with one query and reloaded when the version key in Redis moves,
+    Market and Currency saves bump that key (see currencies/signals.py).
+    the key is checked at most once per MARKET_REGISTRY_CHECK_INTERVAL seconds.
+    """
+
+    version_key = 'markets:version'
+
+    def __init__(self):
+        self.redis_client = get_redis_client()
+        self.by_symbol = {}
+        self.by_id = {}
+        self.version = None
+        self.checked_at = 0
+
+    def get(self, market_symbol: str):
+        """
+        market metadata by symbol, or None if the market does not exist.
+        """
+        self._ensure_fresh()
+        return self.by_symbol.get(market_symbol)
+
+    def get_by_id(self, market_id: int):
+        """
+        market metadata by id.
+        ids come from existing rows, so a miss means the copy is older than the market and it is reloaded.
+        """
+        self._ensure_fresh()
+        market = self.by_id.get(market_id)
+        if market is None:
+            self._load()
+            market = self.by_id.get(market_id)
+        return market
+
+    def exists(self, market_symbol: str) -> bool:
+        return self.get(market_symbol) is not None
+
+    def all(self):
+        """
+        metadata of every market , ordered by id.
+        """
+        self._ensure_fresh()
+        return sorted(self.by_id.values(), key=lambda market: market.id)
+
+    def invalidate(self):
+        """
+        drop the local copy now and tell the other processes to reload theirs once the change is committed.
+        """
+        self.version = None
+        transaction.on_commit(self._bump_version)
+
+    def _bump_version(self):
+        try:
+            self.redis_client.incr(self.version_key)
+        except Exception as e:
+            print(f"Error bumping market registry version: {str(e)}")
+
+    def _ensure_fresh(self):
+        now = time.monotonic()
+        if self.version is not None and now - self.checked_at < settings.MARKET_REGISTRY_CHECK_INTERVAL:
+            return
+        self.checked_at = now
+        version = self._get_remote_version()
+        if self.version is None or version != self.version:
+            self._load()
+            self.version = version
+
+    def _get_remote_version(self) -> int:
+        try:
+            return int(self.redis_client.get(self.version_key) or 0)
+        except Exception as e:
+            #without redis only local saves invalidate the registry
+            print(f"Error reading market registry version: {str(e)}")
+            return self.version or 0
+
+    def _load(self):
+        markets = [
+            MarketInfo.from_market(market)
+            for market in Market.objects.select_related('base_currency', 'quote_currency')
+        ]
+        self.by_symbol = {market.symbol: market for market in markets}
+        self.by_id = {market.id: market for market in markets}
+
+
+"""
+using singleton pattern
+"""
+market_registry = MarketRegistry()
@@ -0,0 +1,12 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from currencies.models import Currency, Market
+from currencies.registry import market_registry
+
+
+@receiver(post_save, sender=Market)
+@receiver(post_delete, sender=Market)
+@receiver(post_save, sender=Currency)
+def invalidate_market_registry(sender, instance, **kwargs):
+    #every process reloads its market metadata on the next lookup
+    market_registry.invalidate()
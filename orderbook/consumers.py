@@ -0,0 +1,47 @@
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from django.conf import settings
+from currencies.registry import market_registry
+from orderbook.services import order_book_service
+from orderbook.streaming import order_book_stream
+
+
+class OrderBookConsumer(AsyncJsonWebsocketConsumer):
+    """
+    stream of one market book: a snapshot first, then depth diffs and trade prints.
+    every message carries the book sequence number , a client drops diffs with
+    sequence <= snapshot sequence and sends {"action": "resync"} when it sees a gap.
+    """
+
+    async def connect(self):
+        self.market_symbol = self.scope['url_route']['kwargs']['market_symbol']
+        self.group_name = None
+        if not await database_sync_to_async(market_registry.exists)(self.market_symbol):
+            await self.close(code=4004)
+            return
+        
+        #join before the snapshot is read , diffs published meanwhile are queued behind it
+        self.group_name = order_book_stream.get_group_name(self.market_symbol)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+        await self.send_snapshot()
+    
+    async def disconnect(self, code):
+        if self.group_name:
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+    
+    async def receive_json(self, content, **kwargs):
+        if content.get('action') == 'resync':
+            await self.send_snapshot()
+    
+    async def book_event(self, message):
+        #one depth diff / trade print event published by the order book service
+        await self.send_json(message['event'])
+    
+    async def send_snapshot(self):
+        #shared with the other subscribers through the sequence keyed snapshot cache
+        snapshot = await database_sync_to_async(order_book_service.get_cached_order_book)(
+            self.market_symbol, settings.ORDER_BOOK_STREAM_DEPTH
+        )
+        snapshot["event"] = "snapshot"
+        await self.send_json(snapshot)
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from currencies.models import Market
+from orderbook.services import order_book_service
+
+
+class Command(BaseCommand):
+    help = "Convert Redis order books from json members to order id keyed members with a payload hash."
+
+    def add_arguments(self, parser):
+        parser.add_argument('market_symbols', nargs='*', help="markets to convert (default: all markets)")
+        parser.add_argument('--rebuild', action='store_true', help="rebuild the books from postgres instead (scores in market ticks)")
+
+    def handle(self, *args, **options):
+        market_symbols = options['market_symbols'] or Market.objects.values_list('symbol', flat=True)
+
+        for market_symbol in market_symbols:
+            if options['rebuild']:
+                order_book_service.sync_order_book(market_symbol)
+                continue
+            converted = order_book_service.migrate_order_book_layout(market_symbol)
+            self.stdout.write(f"{market_symbol}: {converted} orders converted")
@@ -0,0 +1,6 @@
+from django.urls import path
+from orderbook.consumers import OrderBookConsumer
+
+websocket_urlpatterns = [
+    path("ws/order-book/<str:market_symbol>/", OrderBookConsumer.as_asgi()),
+]
@@ -0,0 +1,122 @@
+#server-side Lua scripts of the Redis book.
+#every script gets the 8 keys of a market book (OrderBookService._get_book_keys) : order set , order payloads ,
+#price levels and level depth of the buy side , then the same 4 keys of the sell side.
+#amounts are integer units of 1e-8 and price levels are normalized prices , like in OrderBookService.
+#an order payload carries its level member and units , so a later delta moves its level back without parsing it.
+#both scripts also write the best bid / ask of the book to its field of the ticker hash (orders/tickers.py).
+#the scripts are registered once per process and called by their SHA.
+
+#shared helpers: side offsets in KEYS , price level moves and the top of book
+#every number is computed in python and passed as a string (integer units , level members , scores) ,
+#the scripts never parse decimals and never do arithmetic on lua doubles
+_PRELUDE = """
+local base_of = {buy = 0, sell = 4}
+local changed = {}
+local changed_order = {}
+
+-- negate an integer units string (exact , HINCRBY parses it)
+local function negate(units)
+    if string.sub(units, 1, 1) == '-' then
+        return string.sub(units, 2)
+    end
+    return '-' .. units
+end
+
+-- move one price level by units and order count , score is only needed to create the level
+local function move(side, member, score, units, count)
+    local base = base_of[side]
+    local key = side .. ':' .. member
+    if not changed[key] then
+        changed[key] = {side, member}
+        table.insert(changed_order, key)
+    end
+    if score then
+        redis.call('ZADD', KEYS[base + 3], score, member)
+    end
+    redis.call('HINCRBY', KEYS[base + 4], member, units)
+    redis.call('HINCRBY', KEYS[base + 4], member .. ':count', count)
+end
+
+-- add or replace one resting order
+local function rest(side, id, score, member, units, payload)
+    local base = base_of[side]
+    redis.call('ZADD', KEYS[base + 1], score, id)
+    redis.call('HSET', KEYS[base + 2], id, payload)
+    move(side, member, score, units, 1)
+end
+
+-- best bid / ask (lowest score of each level set) as the top of book field of the ticker hash
+local function write_top(tickers, field)
+    local bid = redis.call('ZRANGE', KEYS[3], 0, 0)[1]
+    local ask = redis.call('ZRANGE', KEYS[7], 0, 0)[1]
+    redis.call('HSET', tickers, field, cjson.encode({bid = bid or false, ask = ask or false}))
+end
+"""
+
+#ARGV: timestamp , top of book field , then 7 values per order: side , id , resting (1/0) , score , level member , units , payload
+#KEYS 9 , 10 and 11: last update time , book sequence and ticker hash
+#returns the new sequence , then side , member , units and order count of every changed level
+#(count 0 = the level was removed)
+#the previous payloads are all read and checked before the first write , so a bad payload leaves the book untouched
+APPLY_DELTA = _PRELUDE + """
+local previous = {}
+for i = 3, #ARGV, 7 do
+    local raw = redis.call('HGET', KEYS[base_of[ARGV[i]] + 2], ARGV[i + 1])
+    if raw then
+        local data = cjson.decode(raw)
+        if type(data['level']) ~= 'string' or type(data['units']) ~= 'string' then
+            return redis.error_reply('order ' .. ARGV[i + 1] .. ' has a payload without level / units , rebuild the book')
+        end
+        previous[i] = data
+    end
+end
+
+for i = 3, #ARGV, 7 do
+    local side, id = ARGV[i], ARGV[i + 1]
+    local base = base_of[side]
+    local data = previous[i]
+    if data then
+        move(side, data['level'], nil, negate(data['units']), -1)
+    end
+    if ARGV[i + 2] == '1' then
+        rest(side, id, ARGV[i + 3], ARGV[i + 4], ARGV[i + 5], ARGV[i + 6])
+    else
+        redis.call('ZREM', KEYS[base + 1], id)
+        redis.call('HDEL', KEYS[base + 2], id)
+    end
+end
+
+redis.call('SET', KEYS[9], ARGV[1])
+local result = {redis.call('INCR', KEYS[10])}
+
+-- drop the price levels that lost their last order
+for _, key in ipairs(changed_order) do
+    local side, member = changed[key][1], changed[key][2]
+    local depth_key = KEYS[base_of[side] + 4]
+    local values = redis.call('HMGET', depth_key, member, member .. ':count')
+    local count = tonumber(values[2] or 0)
+    if count <= 0 then
+        redis.call('ZREM', KEYS[base_of[side] + 3], member)
+        redis.call('HDEL', depth_key, member, member .. ':count')
+        values[1] = '0'
+        count = 0
+    end
+    table.insert(result, side)
+    table.insert(result, member)
+    table.insert(result, values[1] or '0')
+    table.insert(result, count)
+end
+write_top(KEYS[11], ARGV[2])
+return result
+"""
+
+#ARGV: top of book field , then 6 values per order: side , id , score , level member , units , payload
+#KEYS 9: ticker hash
+#adds orders to a book that does not hold them yet (rebuilds) , returns the number of added orders
+ADD_ORDERS = _PRELUDE + """
+for i = 2, #ARGV, 6 do
+    rest(ARGV[i], ARGV[i + 1], ARGV[i + 2], ARGV[i + 3], ARGV[i + 4], ARGV[i + 5])
+end
+write_top(KEYS[9], ARGV[1])
+return (#ARGV - 1) / 6
+"""
@@ -1,14 +1,25 @@
 import redis
 import json
+import secrets
 # import logging
 from decimal import Decimal
 from typing import Dict
 from collections import defaultdict
+from django.conf import settings
 from orders.models import Order
-from currencies.models import Market
+from orders.book import BookEntry
+from orders.fixed import FixedPoint, DEFAULT_SCALE
+from currencies.registry import market_registry
+from orderbook.streaming import order_book_stream
+from orderbook.scripts import APPLY_DELTA, ADD_ORDERS
+from core.redis_pool import get_redis_client
 
 # logger = logging.getLogger(__name__)
 
+AMOUNT_UNITS = Decimal('100000000')
+#one hash for the tickers of every market: trade statistics (orders/tickers.py) and top of book fields
+TICKERS_KEY = "tickers"
+
 class OrderBookService:
     """
     this class is responsible for maintaining the order book
@@ -16,8 +27,11 @@ class OrderBookService:
     """
     
     def __init__(self):
-        self.redis_client = redis.Redis(host='localhost', port=6379, db=0, decode_responses=True)
+        self.redis_client = get_redis_client()
         self.default_limit = 10
+        #book mutations run server side , loaded once and called by SHA (EVALSHA)
+        self.apply_delta_script = self.redis_client.register_script(APPLY_DELTA)
+        self.add_orders_script = self.redis_client.register_script(ADD_ORDERS)
     
     def get_order_book(self, market_symbol: str, limit: int = None):
         """
@@ -36,8 +50,9 @@ class OrderBookService:
             sell = self._get_sell_from_redis(market_symbol, limit)
             buy = self._get_buy_from_redis(market_symbol, limit)
             
-            # if Redis is empty, sync with postgres
-            if not sell and not buy:
+            # if Redis is empty and never held the book (first use , flush , failover), sync with postgres ,
+            # a book emptied by the engine keeps its last sync time and is not rebuilt by every read
+            if not sell and not buy and not self.redis_client.exists(self._get_last_sync_key(market_symbol)):
                 self.sync_order_book(market_symbol)
                 sell = self._get_sell_from_redis(market_symbol, limit)
                 buy = self._get_buy_from_redis(market_symbol, limit)
@@ -54,29 +69,118 @@ class OrderBookService:
             # in case of error, read from postgres
             return self._get_order_book_from_db(market_symbol, limit)
     
-    def update_order_book(self, market_symbol: str):
+    def get_order_book_snapshot(self, market_symbol: str, limit: int = None):
+        """
+        order book with the sequence it was read at.
+        the levels are read between two reads of the sequence and retried if a mutation landed in between.
+        """
+        book = None
+        for _ in range(5):
+            epoch, sequence = self.get_version(market_symbol)
+            book = self.get_order_book(market_symbol, limit)
+            if self.get_version(market_symbol) == (epoch, sequence):
+                break
+        book["epoch"] = epoch
+        book["sequence"] = sequence
+        return book
+    
+    def get_cached_order_book(self, market_symbol: str, limit: int = None):
         """
-        update the order book in Redis based on changes in postgres.
-        this method is called after each order match.
+        order book snapshot served from a cache per (market, limit) keyed on the book sequence.
+        an unchanged book costs one MGET , a changed one is rebuilt and cached once for every reader.
         """
+        if limit is None:
+            limit = self.default_limit
+        snapshot_key = self._get_snapshot_key(market_symbol, limit)
+        
         try:
-            if not self._market_exists(market_symbol):
-                print(f"Market {market_symbol} does not exist")
-                return
+            epoch, sequence, cached = self.redis_client.mget(
+                self._get_epoch_key(market_symbol), self._get_sequence_key(market_symbol), snapshot_key
+            )
+            if cached is not None:
+                book = json.loads(cached)
+                if (book.get("epoch"), book["sequence"]) == (epoch, int(sequence or 0)):
+                    return book
+            
+            book = self.get_order_book_snapshot(market_symbol, limit)
+            #never cache the postgres fallback , it has no sequence of its own
+            if "source" not in book:
+                self.redis_client.set(snapshot_key, json.dumps(book), ex=settings.ORDER_BOOK_SNAPSHOT_TTL)
+            return book
             
-            #clear current order book
-            self._clear_order_book_cache(market_symbol)
-            
-            #rebuild from postgres
-            self._rebuild_order_book_from_db(market_symbol)
-            
-            #set last update time
-            self._set_last_update_time(market_symbol)
+        except Exception as e:
+            print(f"Error getting cached order book for {market_symbol}: {str(e)}")
+            return self.get_order_book(market_symbol, limit)
+    
+    def get_sequence(self, market_symbol: str) -> int:
+        """
+        current sequence of the market book , bumped by every mutation.
+        """
+        return int(self.redis_client.get(self._get_sequence_key(market_symbol)) or 0)
+    
+    def get_version(self, market_symbol: str):
+        """
+        (epoch , sequence) of the market book in one MGET.
+        the epoch is a random token replaced by every rebuild and recreated when redis lost it (flush , failover) ,
+        so a sequence counting again from 0 never matches a version read before.
+        """
+        epoch, sequence = self.redis_client.mget(self._get_epoch_key(market_symbol), self._get_sequence_key(market_symbol))
+        if epoch is None:
+            #NX , concurrent readers all end up with the first token written
+            self.redis_client.set(self._get_epoch_key(market_symbol), self._new_epoch(), nx=True)
+            epoch = self.redis_client.get(self._get_epoch_key(market_symbol))
+        return epoch, int(sequence or 0)
+    
+    def update_order_book(self, market_symbol: str, resting=(), removed=(), trades=()):
+        """
+        apply only the orders touched by a match (fill, partial fill, add, cancel) to Redis.
+        resting orders are written with their current remaining amount, removed orders are dropped.
+        the price level aggregate is moved by the difference to the previous payload of each order.
+        everything , with the bump of the book sequence , runs in one Lua script (one atomic round trip),
+        then the changed levels and trades are published as one stream event. returns the new sequence.
+        the full rebuild from postgres only runs from sync_order_book.
+        """
+        try:
+            if not resting and not removed:
+                return None
+            
+            args = [self._get_current_timestamp(), self._get_top_field(market_symbol)]
+            for entry, is_resting in [(entry, True) for entry in resting] + [(entry, False) for entry in removed]:
+                args.extend([entry.side, entry.id, int(is_resting)])
+                args.extend(self._get_entry_args(market_symbol, entry) if is_resting else ['', '', '', ''])
+            result = self.apply_delta_script(
+                keys=self._get_book_keys(market_symbol) + [
+                    f"orderbook:last_update:{market_symbol}", self._get_sequence_key(market_symbol), TICKERS_KEY
+                ],
+                args=args,
+                client=self.redis_client
+            )
+            sequence = result[0]
+            
+            #depth diff: new absolute amount and count of every changed level (count 0 = level removed)
+            event = {
+                "event": "update",
+                "market_symbol": market_symbol,
+                "sequence": sequence,
+                Order.OrderSide.BUY.value: [],
+                Order.OrderSide.SELL.value: [],
+                "trades": [self._get_trade_data(trade) for trade in trades],
+                "timestamp": self._get_current_timestamp()
+            }
+            for index in range(1, len(result), 4):
+                side, member, units, count = result[index:index + 4]
+                event[side].append({
+                    "price": float(Decimal(member)),
+                    "amount": float(self._from_units(units)) if count else 0.0,
+                    "count": count
+                })
+            order_book_stream.publish(market_symbol, event)
             
-            print(f"Order book updated for {market_symbol}")
+            return sequence
             
         except Exception as e:
             print(f"Error updating order book for {market_symbol}: {str(e)}")
+            return None
     
     def sync_order_book(self, market_symbol: str):
         """
@@ -95,11 +199,33 @@ class OrderBookService:
             
             if self.redis_client.set(lock_key, "1", nx=True, ex=30):  # 30-second lock
                 try:
-                    self._clear_order_book_cache(market_symbol)
+                    #clear and rebuild in one MULTI , readers never see a half built book
+                    pipe = self.redis_client.pipeline(transaction=True)
+                    
+                    self._clear_order_book_cache(market_symbol, pipe)
+                    
+                    rebuilt = self._rebuild_order_book_from_db(market_symbol, pipe)
+                    
+                    self._set_last_sync_time(market_symbol, pipe)
                     
-                    self._rebuild_order_book_from_db(market_symbol)
+                    #diffs can not describe a rebuild , subscribers take a new snapshot and etags change
+                    #(an empty book rebuilt empty is not a change , its version stays)
+                    if rebuilt:
+                        self._new_version(market_symbol, pipe)
+                    results = pipe.execute()
+                    sequence = results[-1] if rebuilt else None
+                    if results[0] and not rebuilt:
+                        #the book was emptied
+                        pipe = self.redis_client.pipeline(transaction=True)
+                        self._new_version(market_symbol, pipe)
+                        sequence = pipe.execute()[-1]
                     
-                    self._set_last_sync_time(market_symbol)
+                    if sequence is not None:
+                        order_book_stream.publish(market_symbol, {
+                            "event": "resync",
+                            "market_symbol": market_symbol,
+                            "sequence": sequence
+                        })
                     
                     print(f"Order book sync completed for {market_symbol}")
                     
@@ -112,66 +238,75 @@ class OrderBookService:
         except Exception as e:
             print(f"Error syncing order book for {market_symbol}: {str(e)}")
     
-    def _get_sell_from_redis(self, market_symbol: str, limit: int):
-
-        #create redis key
-        redis_key = f"orderbook:{market_symbol}:sell"
-        orders_data = self.redis_client.zrange(redis_key, 0, limit - 1, withscores=True)
-        
-        #aggregate orders with the same price
-        price_groups = defaultdict(Decimal)
-        
-        for order_json, score in orders_data:
-            order_data = json.loads(order_json)
-            price = Decimal(order_data['price'])
-            amount = Decimal(order_data['amount'])
-            price_groups[price] += amount
-        
-        #convert to list and sort by price (ascending)
-        sell = []
-        for price in sorted(price_groups.keys()):
-            sell.append({
-                "price": float(price),
-                "amount": float(price_groups[price])
+    def replace_order_book(self, market_symbol: str, entries):
+        """
+        replace the Redis book of a market with the given resting orders in one MULTI.
+        used when the engine restores its books without postgres (journal replay , snapshots).
+        """
+        try:
+            pipe = self.redis_client.pipeline(transaction=True)
+            self._clear_order_book_cache(market_symbol, pipe)
+            self._add_entries_to_redis(pipe, market_symbol, entries)
+            self._set_last_sync_time(market_symbol, pipe)
+            self._new_version(market_symbol, pipe)
+            sequence = pipe.execute()[-1]
+            
+            order_book_stream.publish(market_symbol, {
+                "event": "resync",
+                "market_symbol": market_symbol,
+                "sequence": sequence
             })
-        
-        return sell[:limit]
+            
+        except Exception as e:
+            print(f"Error replacing order book for {market_symbol}: {str(e)}")
+    
+    def _get_sell_from_redis(self, market_symbol: str, limit: int):
+        #best levels first (ascending price)
+        return self._get_levels_from_redis(market_symbol, Order.OrderSide.SELL, limit)
     
     def _get_buy_from_redis(self, market_symbol: str, limit: int):
+        #best levels first (descending price)
+        return self._get_levels_from_redis(market_symbol, Order.OrderSide.BUY, limit)
+    
+    def _get_levels_from_redis(self, market_symbol: str, side: str, limit: int):
+        """
+        read the best `limit` price levels from the maintained aggregate.
+        the cost depends on the number of levels, not on the number of orders.
+        """
+        prices = self.redis_client.zrange(self._get_levels_key(market_symbol, side), 0, limit - 1)
+        if not prices:
+            return []
         
-        #create redis key
-        redis_key = f"orderbook:{market_symbol}:buy"
-        orders_data = self.redis_client.zrange(redis_key, 0, limit - 1, withscores=True)
-        
-        #aggregate orders with the same price
-        price_groups = defaultdict(Decimal)
-        
-        for order_json, score in orders_data:
-            order_data = json.loads(order_json)
-            price = Decimal(order_data['price'])
-            amount = Decimal(order_data['amount'])
-            price_groups[price] += amount
+        fields = []
+        for price in prices:
+            fields.extend([price, f"{price}:count"])
+        values = self.redis_client.hmget(self._get_depth_key(market_symbol, side), fields)
         
-        #convert to list and sort by price (descending)
-        buy = []
-        for price in sorted(price_groups.keys(), reverse=True):
-            buy.append({
-                "price": float(price),
-                "amount": float(price_groups[price])  
+        levels = []
+        for index, price in enumerate(prices):
+            units, count = values[index * 2], values[index * 2 + 1]
+            if units is None:
+                continue
+            levels.append({
+                "price": float(Decimal(price)),
+                "amount": float(self._from_units(units)),
+                "count": int(count or 0)
             })
         
-        return buy[:limit]
+        return levels
     
     def _get_order_book_from_db(self, market_symbol: str, limit: int) -> Dict:
         """
         retrieve order book directly from postgres (fallback).
         """
         try:
-            market = Market.objects.get(symbol=market_symbol)
+            market = market_registry.get(market_symbol)
+            if market is None:
+                raise LookupError(market_symbol)
             
             #sell orders - ascending price
             sell_orders = Order.objects.filter(
-                target_market=market,
+                target_market_id=market.id,
                 order_side=Order.OrderSide.SELL,
                 order_state__in=[Order.OrderState.WAITING, Order.OrderState.PARTIALLY_FILLED],
                 remaining_amount__gt=0
@@ -179,7 +314,7 @@ class OrderBookService:
             
             #buy orders - descending price  
             buy_orders = Order.objects.filter(
-                target_market=market,
+                target_market_id=market.id,
                 order_side=Order.OrderSide.BUY,
                 order_state__in=[Order.OrderState.WAITING, Order.OrderState.PARTIALLY_FILLED],
                 remaining_amount__gt=0
@@ -187,26 +322,32 @@ class OrderBookService:
             
             #aggregate sell orders
             sell_groups = defaultdict(Decimal)
+            sell_counts = defaultdict(int)
             for order in sell_orders:
                 sell_groups[order['price']] += order['remaining_amount']
+                sell_counts[order['price']] += 1
             
             sell = []
             for price in sorted(sell_groups.keys()):
                 sell.append({
                     "price": float(price),
-                    "amount": float(sell_groups[price])
+                    "amount": float(sell_groups[price]),
+                    "count": sell_counts[price]
                 })
             
             #aggregate buy orders
             buy_groups = defaultdict(Decimal)
+            buy_counts = defaultdict(int)
             for order in buy_orders:
                 buy_groups[order['price']] += order['remaining_amount']
+                buy_counts[order['price']] += 1
             
             buy = []
             for price in sorted(buy_groups.keys(), reverse=True):
                 buy.append({
                     "price": float(price),
-                    "amount": float(buy_groups[price])
+                    "amount": float(buy_groups[price]),
+                    "count": buy_counts[price]
                 })
             
             return {
@@ -217,7 +358,7 @@ class OrderBookService:
                 "source": "database"
             }
             
-        except Market.DoesNotExist:
+        except LookupError:
             print(f"Market {market_symbol} not found in database")
             return {
                 "market_symbol": market_symbol,
@@ -227,69 +368,234 @@ class OrderBookService:
                 "error": "Market not found"
             }
     
-    def _rebuild_order_book_from_db(self, market_symbol: str):
+    def _rebuild_order_book_from_db(self, market_symbol: str, client=None):
         """
         Fully rebuild the order book in Redis from postgres.
+        commands are queued on client (a pipeline) , or on a new pipeline executed here.
+        returns the number of rebuilt orders.
         """
         try:
-            market = Market.objects.get(symbol=market_symbol)
+            pipe = client if client is not None else self.redis_client.pipeline(transaction=True)
+            
+            market = market_registry.get(market_symbol)
+            if market is None:
+                print(f"Market {market_symbol} not found")
+                return 0
             
             #retrieve active orders
             active_orders = Order.objects.filter(
-                target_market=market,
+                target_market_id=market.id,
                 order_state__in=[Order.OrderState.WAITING, Order.OrderState.PARTIALLY_FILLED],
                 remaining_amount__gt=0
-            ).select_related('target_market')
+            )
+            
+            #add to Redis in one script call
+            rebuilt = self._add_entries_to_redis(pipe, market_symbol, [BookEntry.from_order(order, self._get_scale(market_symbol)) for order in active_orders])
             
-            #add to Redis
-            for order in active_orders:
-                self._add_order_to_redis(order)
+            if client is None:
+                pipe.execute()
+            return rebuilt
                 
-        except Market.DoesNotExist:
-            print(f"Market {market_symbol} not found")
         except Exception as e:
             print(f"Error rebuilding order book for {market_symbol}: {str(e)}")
+            return 0
     
-    def _add_order_to_redis(self, order: Order):
+    def _add_entries_to_redis(self, client, market_symbol: str, entries) -> int:
         """
-        add a single order to redis.
+        queue one call of the script that adds resting orders (order set , payload and level aggregate).
+        the book must not hold them yet (rebuilds). returns the number of queued orders.
+        an empty rebuild still runs it , so the top of book of the ticker is reset.
         """
-        try:
-            market_symbol = order.target_market.symbol
-            side = order.order_side
-            
-            order_data = {
-                'id': order.id,
-                'price': str(order.price),
-                'amount': str(order.remaining_amount),
-                'created_at': order.created_at.isoformat()
-            }
-            
-            redis_key = f"orderbook:{market_symbol}:{side}"
-            
-            #determine score based on order type
-            if side == Order.OrderSide.BUY:
-                #buy: higher price has priority (negative for descending order)
-                score = float(-order.price)
-            else:
-                #sell: lower price has priority
-                score = float(order.price)
-            
-            self.redis_client.zadd(redis_key, {json.dumps(order_data): score})
-            
-        except Exception as e:
-            print(f"Error adding order {order.id} to Redis: {str(e)}")
+        args = [self._get_top_field(market_symbol)]
+        for entry in entries:
+            args.extend([entry.side, entry.id])
+            args.extend(self._get_entry_args(market_symbol, entry))
+        self.add_orders_script(keys=self._get_book_keys(market_symbol) + [TICKERS_KEY], args=args, client=client)
+        return len(entries)
+    
+    def _get_entry_args(self, market_symbol: str, entry: BookEntry):
+        #score , level member , units and payload of a resting order , as the scripts take them
+        scale = self._get_scale(market_symbol)
+        ticks = entry.ticks if entry.scale == scale else scale.to_ticks(entry.price)
+        return [
+            -ticks if entry.side == Order.OrderSide.BUY else ticks,
+            self._get_level_member(entry.price),
+            str(self._to_units(entry.remaining_amount)),
+            json.dumps(self._get_order_data(entry))
+        ]
+    
+    def _get_book_keys(self, market_symbol: str):
+        return [
+            key
+            for side in (Order.OrderSide.BUY, Order.OrderSide.SELL)
+            for key in (
+                self._get_redis_key(market_symbol, side),
+                self._get_orders_key(market_symbol, side),
+                self._get_levels_key(market_symbol, side),
+                self._get_depth_key(market_symbol, side),
+            )
+        ]
+    
+    def _get_top_field(self, market_symbol: str) -> str:
+        #best bid / ask of the market in the ticker hash
+        return f"{market_symbol}:top"
+    
+    def _get_redis_key(self, market_symbol: str, side: str) -> str:
+        return f"orderbook:{market_symbol}:{side}"
+    
+    def _get_orders_key(self, market_symbol: str, side: str) -> str:
+        #hash of order id -> order payload , scores live in the sorted set
+        return f"orderbook:{market_symbol}:{side}:orders"
+    
+    def _get_levels_key(self, market_symbol: str, side: str) -> str:
+        #sorted set of price levels (member: normalized price, score: same as the order set)
+        return f"orderbook:{market_symbol}:{side}:levels"
+    
+    def _get_sequence_key(self, market_symbol: str) -> str:
+        #bumped by every mutation of the book , stream events carry it
+        return f"orderbook:seq:{market_symbol}"
+    
+    def _get_epoch_key(self, market_symbol: str) -> str:
+        #random token of the current build of the book , see get_version
+        return f"orderbook:epoch:{market_symbol}"
+    
+    def _new_epoch(self) -> str:
+        return secrets.token_hex(8)
+    
+    def _new_version(self, market_symbol: str, pipe):
+        #queue a new epoch and a sequence bump , the bumped sequence is the last result of the pipeline
+        pipe.set(self._get_epoch_key(market_symbol), self._new_epoch())
+        pipe.incr(self._get_sequence_key(market_symbol))
+    
+    def _get_snapshot_key(self, market_symbol: str, limit: int) -> str:
+        #serialized book of `limit` levels , valid while its sequence is the current one
+        return f"orderbook:snapshot:{market_symbol}:{limit}"
+    
+    def _get_depth_key(self, market_symbol: str, side: str) -> str:
+        #hash of price -> total amount in units and price:count -> number of orders
+        return f"orderbook:{market_symbol}:{side}:depth"
+    
+    def _get_level_member(self, price: Decimal) -> str:
+        #same price must map to the same member whatever the decimal exponent is
+        return format(price.normalize(), 'f')
+    
+    def _to_units(self, amount: Decimal) -> int:
+        #amounts have 8 decimal places, integers keep HINCRBY exact
+        return int(amount * AMOUNT_UNITS)
+    
+    def _from_units(self, units) -> Decimal:
+        return Decimal(int(units)) / AMOUNT_UNITS
     
-    def _clear_order_book_cache(self, market_symbol: str):
+    def _add_to_level(self, client, market_symbol: str, side: str, price: Decimal, amount: Decimal, count: int):
+        """
+        queue the commands that move one price level by amount and order count.
+        client can be the redis client or a pipeline.
+        """
+        member = self._get_level_member(price)
+        client.zadd(self._get_levels_key(market_symbol, side), {member: self._get_score(market_symbol, side, price)})
+        client.hincrby(self._get_depth_key(market_symbol, side), member, self._to_units(amount))
+        client.hincrby(self._get_depth_key(market_symbol, side), f"{member}:count", count)
+    
+    def _get_score(self, market_symbol: str, side: str, price: Decimal) -> int:
+        """
+        sorted set score of a price level , the price in integer ticks of the market
+        (exact in the double score up to 2**53 ticks , a float price loses digits on high-priced assets).
+        buy: higher price has priority (negative for descending order)
+        sell: lower price has priority
+        """
+        ticks = self._get_scale(market_symbol).to_ticks(price)
+        if side == Order.OrderSide.BUY:
+            return -ticks
+        return ticks
+    
+    def _get_scale(self, market_symbol: str) -> FixedPoint:
+        market = market_registry.get(market_symbol)
+        return market.scale if market is not None else DEFAULT_SCALE
+    
+    def _get_order_data(self, entry: BookEntry) -> Dict:
+        return self._get_payload(entry.id, entry.price, entry.remaining_amount, entry.created_at.isoformat() if entry.created_at else None)
+    
+    def _get_payload(self, order_id, price: Decimal, amount: Decimal, created_at) -> Dict:
+        """
+        order payload of the redis book.
+        level and units are what the scripts move the price level back by when the order changes ,
+        they are computed here so the scripts never parse a decimal (str(Decimal) can be '5E-7').
+        """
+        return {
+            'id': order_id,
+            'price': format(price, 'f'),
+            'amount': format(amount, 'f'),
+            'level': self._get_level_member(price),
+            'units': str(self._to_units(amount)),
+            'created_at': created_at
+        }
+    
+    def _get_trade_data(self, trade) -> Dict:
+        #trade print of the stream , side is the taker side
+        return {
+            'id': trade.id,
+            'price': float(trade.price),
+            'amount': float(trade.amount),
+            'side': trade.taker.order_side,
+            'timestamp': trade.created_at.isoformat() if trade.created_at else None
+        }
+    
+    def migrate_order_book_layout(self, market_symbol: str) -> int:
+        """
+        convert a book stored with json members in the sorted set to the order id keyed layout.
+        the payloads get the level and units the scripts read.
+        returns the number of converted orders.
+        """
+        converted = 0
+        for side in (Order.OrderSide.BUY, Order.OrderSide.SELL):
+            redis_key = self._get_redis_key(market_symbol, side)
+            members = self.redis_client.zrange(redis_key, 0, -1, withscores=True)
+            legacy = [(member, score) for member, score in members if member.startswith('{')]
+            if not legacy:
+                continue
+            
+            pipe = self.redis_client.pipeline(transaction=True)
+            for member, _ in legacy:
+                order_data = json.loads(member)
+                price = Decimal(order_data['price'])
+                pipe.zrem(redis_key, member)
+                pipe.zadd(redis_key, {order_data['id']: self._get_score(market_symbol, side, price)})
+                pipe.hset(
+                    self._get_orders_key(market_symbol, side), order_data['id'],
+                    json.dumps(self._get_payload(order_data['id'], price, Decimal(order_data['amount']), order_data.get('created_at')))
+                )
+            pipe.execute()
+            converted += len(legacy)
+            
+            self._rebuild_levels_from_orders(market_symbol, side)
+        
+        return converted
+    
+    def _rebuild_levels_from_orders(self, market_symbol: str, side: str):
+        """
+        recompute the price level aggregate of one side from the order payload hash.
+        """
+        orders = self.redis_client.hvals(self._get_orders_key(market_symbol, side))
+        pipe = self.redis_client.pipeline(transaction=True)
+        pipe.delete(self._get_levels_key(market_symbol, side), self._get_depth_key(market_symbol, side))
+        for order_json in orders:
+            order_data = json.loads(order_json)
+            self._add_to_level(pipe, market_symbol, side, Decimal(order_data['price']), Decimal(order_data['amount']), 1)
+        pipe.execute()
+    
+    def _clear_order_book_cache(self, market_symbol: str, client=None):
         """
         clear the order book from Redis.
+        all keys go in a single DEL , queued on client when a pipeline is given.
         """
         try:
             buy_key = f"orderbook:{market_symbol}:buy"
             sell_key = f"orderbook:{market_symbol}:sell"
-     
-            self.redis_client.delete(buy_key)
-            self.redis_client.delete(sell_key)
+            
+            (client if client is not None else self.redis_client).delete(
+                buy_key, f"{buy_key}:orders", f"{buy_key}:levels", f"{buy_key}:depth",
+                sell_key, f"{sell_key}:orders", f"{sell_key}:levels", f"{sell_key}:depth",
+            )
             
         except Exception as e:
             print(f"Error clearing order book cache for {market_symbol}: {str(e)}")
@@ -298,11 +604,7 @@ class OrderBookService:
         """
         check if the market exists.
         """
-        try:
-            Market.objects.get(symbol=market_symbol)
-            return True
-        except Market.DoesNotExist:
-            return False
+        return market_registry.exists(market_symbol)
     
     def _set_last_update_time(self, market_symbol: str):
         """
@@ -311,12 +613,15 @@ class OrderBookService:
         key = f"orderbook:last_update:{market_symbol}"
         self.redis_client.set(key, self._get_current_timestamp())
     
-    def _set_last_sync_time(self, market_symbol: str):
+    def _set_last_sync_time(self, market_symbol: str, client=None):
         """
         set the last sync time.
         """
-        key = f"orderbook:last_sync:{market_symbol}"
-        self.redis_client.set(key, self._get_current_timestamp())
+        (client if client is not None else self.redis_client).set(self._get_last_sync_key(market_symbol), self._get_current_timestamp())
+    
+    def _get_last_sync_key(self, market_symbol: str) -> str:
+        #time of the last full build of the book , missing when redis never held it
+        return f"orderbook:last_sync:{market_symbol}"
     
     def _get_current_timestamp(self) -> str:
         """
@@ -333,11 +638,13 @@ class OrderBookService:
             buy_key = f"orderbook:{market_symbol}:buy"
             sell_key = f"orderbook:{market_symbol}:sell"
             
-            buy_count = self.redis_client.zcard(buy_key)
-            sell_count = self.redis_client.zcard(sell_key)
-            
-            last_update = self.redis_client.get(f"orderbook:last_update:{market_symbol}")
-            last_sync = self.redis_client.get(f"orderbook:last_sync:{market_symbol}")
+            #one round trip for all counters
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.zcard(buy_key)
+            pipe.zcard(sell_key)
+            pipe.get(f"orderbook:last_update:{market_symbol}")
+            pipe.get(self._get_last_sync_key(market_symbol))
+            buy_count, sell_count, last_update, last_sync = pipe.execute()
             
             return {
                 "market_symbol": market_symbol,
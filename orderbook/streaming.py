@@ -0,0 +1,34 @@
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+
+class OrderBookStream:
+    """
+    fan-out of order book mutations to websocket subscribers through the channel layer.
+    every market has one group , the order book service publishes one event per mutation
+    so the cost does not depend on the number of subscribers.
+    """
+
+    def get_group_name(self, market_symbol: str) -> str:
+        return f"orderbook.{market_symbol}"
+
+    def publish(self, market_symbol: str, event: dict):
+        """
+        send one event to every subscriber of the market (see orderbook/consumers.py).
+        """
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            return
+        try:
+            async_to_sync(channel_layer.group_send)(
+                self.get_group_name(market_symbol),
+                {'type': 'book.event', 'event': event}
+            )
+        except Exception as e:
+            print(f"Error publishing order book event for {market_symbol}: {str(e)}")
+
+
+"""
+using singleton pattern
+"""
+order_book_stream = OrderBookStream()
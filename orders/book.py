@@ -0,0 +1,188 @@
+from bisect import bisect_left
+from decimal import Decimal
+from orders.models import Order
+from orders.fixed import FixedPoint, DEFAULT_SCALE
+
+
+class BookEntry:
+    """
+    a resting order inside the in-memory book.
+    only the fields needed for matching are kept, so no model instance is held.
+    the price is held as integer ticks and the amounts as integer lots of the market scale ,
+    the Decimal attributes are converted on access (db / redis / journal boundary).
+    """
+    __slots__ = ('id', 'side', 'ticks', 'amount', 'filled_lots', 'lots', 'created_at', 'scale')
+
+    def __init__(self, id, side, price, amount, filled_amount, remaining_amount, created_at=None, scale: FixedPoint = DEFAULT_SCALE):
+        self.id = id
+        self.side = side
+        self.scale = scale
+        self.ticks = scale.to_ticks(price)
+        self.amount = amount
+        self.filled_lots = scale.to_lots(filled_amount)
+        self.lots = scale.to_lots(remaining_amount)
+        self.created_at = created_at
+
+    @classmethod
+    def from_order(cls, order: Order, scale: FixedPoint = DEFAULT_SCALE):
+        return cls(
+            id=order.id,
+            side=order.order_side,
+            price=order.price,
+            amount=order.amount,
+            filled_amount=order.filled_amount or Decimal('0'),
+            remaining_amount=order.remaining_amount,
+            created_at=order.created_at,
+            scale=scale,
+        )
+
+    def rescale(self, scale: FixedPoint):
+        """
+        the same order in another scale (a book restored with the scale of its market).
+        """
+        if scale == self.scale:
+            return self
+        return BookEntry(
+            self.id, self.side, self.price, self.amount, self.filled_amount, self.remaining_amount, self.created_at, scale
+        )
+
+    @property
+    def price(self) -> Decimal:
+        return self.scale.price(self.ticks)
+
+    @property
+    def filled_amount(self) -> Decimal:
+        return self.scale.amount(self.filled_lots)
+
+    @filled_amount.setter
+    def filled_amount(self, value: Decimal):
+        self.filled_lots = self.scale.to_lots(value)
+
+    @property
+    def remaining_amount(self) -> Decimal:
+        return self.scale.amount(self.lots)
+
+    @remaining_amount.setter
+    def remaining_amount(self, value: Decimal):
+        self.lots = self.scale.to_lots(value)
+
+
+class BookSide:
+    """
+    one side of a market book.
+    price levels are kept in a sorted list with the best price at the end (O(1) pop),
+    each level is an insertion ordered dict used as a FIFO queue with O(1) removal.
+    """
+
+    def __init__(self, side: str):
+        self.side = side
+        #sort keys ascending, best level last (sell: -ticks , buy: ticks)
+        self.keys = []
+        self.levels = {}
+
+    def _key(self, ticks: int) -> int:
+        return -ticks if self.side == Order.OrderSide.SELL else ticks
+
+    def __len__(self):
+        return sum(len(level) for level in self.levels.values())
+
+    def __bool__(self):
+        return bool(self.keys)
+
+    def add(self, entry: BookEntry):
+        key = self._key(entry.ticks)
+        level = self.levels.get(key)
+        if level is None:
+            level = self.levels[key] = {}
+            self.keys.insert(bisect_left(self.keys, key), key)
+        level[entry.id] = entry
+
+    def remove(self, entry: BookEntry):
+        key = self._key(entry.ticks)
+        level = self.levels.get(key)
+        if level is None or level.pop(entry.id, None) is None:
+            return
+        if not level:
+            del self.levels[key]
+            if self.keys and self.keys[-1] == key:
+                self.keys.pop()
+            else:
+                del self.keys[bisect_left(self.keys, key)]
+
+    def best(self):
+        """
+        first order in time priority on the best price level, or None.
+        """
+        if not self.keys:
+            return None
+        return next(iter(self.levels[self.keys[-1]].values()))
+
+    def iter_entries(self):
+        """
+        walk every resting order in price-time priority.
+        """
+        for key in reversed(self.keys):
+            yield from self.levels[key].values()
+
+
+class MarketBook:
+    """
+    in-memory price-time priority book of one market.
+    every entry of the book uses the scale of the book.
+    """
+
+    def __init__(self, market_id: int, scale: FixedPoint = DEFAULT_SCALE):
+        self.market_id = market_id
+        self.scale = scale
+        self.buy = BookSide(Order.OrderSide.BUY)
+        self.sell = BookSide(Order.OrderSide.SELL)
+        self.orders = {}
+
+    def side(self, side: str) -> BookSide:
+        return self.buy if side == Order.OrderSide.BUY else self.sell
+
+    def opposite(self, side: str) -> BookSide:
+        return self.sell if side == Order.OrderSide.BUY else self.buy
+
+    def add(self, entry: BookEntry):
+        if entry.scale is not self.scale:
+            entry = entry.rescale(self.scale)
+        self.orders[entry.id] = entry
+        self.side(entry.side).add(entry)
+
+    def remove(self, order_id: int):
+        entry = self.orders.pop(order_id, None)
+        if entry is not None:
+            self.side(entry.side).remove(entry)
+        return entry
+
+    def upsert(self, entry: BookEntry):
+        """
+        insert or refresh a resting order.
+        a changed price requeues the order, otherwise it keeps its queue position.
+        """
+        if entry.scale is not self.scale:
+            entry = entry.rescale(self.scale)
+        current = self.orders.get(entry.id)
+        if current is None:
+            self.add(entry)
+        elif current.ticks != entry.ticks or current.side != entry.side:
+            self.remove(entry.id)
+            self.add(entry)
+        else:
+            current.amount = entry.amount
+            current.filled_lots = entry.filled_lots
+            current.lots = entry.lots
+        return self.orders[entry.id]
+
+    def rescale(self, scale: FixedPoint):
+        """
+        the same book in another scale , orders keep their price-time priority.
+        """
+        if scale == self.scale:
+            return self
+        book = MarketBook(self.market_id, scale)
+        for side in (self.buy, self.sell):
+            for entry in side.iter_entries():
+                book.add(entry)
+        return book
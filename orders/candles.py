@@ -0,0 +1,231 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest, Least
+from django.utils import timezone
+from orders.models import Candle
+from currencies.registry import market_registry
+from core.redis_pool import get_redis_client
+
+#seconds of every candle interval , the open bar of each one is a redis hash per market
+INTERVALS = {
+    Candle.Interval.ONE_MINUTE.value: 60,
+    Candle.Interval.FIVE_MINUTES.value: 300,
+    Candle.Interval.ONE_HOUR.value: 3600,
+    Candle.Interval.ONE_DAY.value: 86400,
+}
+
+VOLUME_UNITS = Decimal('100000000')
+
+#KEYS: open bar hash of every interval , ARGV: the seconds of the same intervals ,
+#then 3 values per trade: unix time , price (decimal string) , amount in integer units of 1e-8.
+#prices are compared as lua numbers but kept as the given strings , volume is summed with HINCRBY (exact).
+#returns the bars that left redis: {interval index , 'closed' / 'late' , open time , open , high , low , close , units , trades}
+#a 'late' bar is a trade older than the open bar (a match committed after a newer one) , merged into postgres.
+APPLY_TRADES = """
+local result = {}
+local intervals = #KEYS
+for k = 1, intervals do
+    local seconds = tonumber(ARGV[k])
+    for i = intervals + 1, #ARGV, 3 do
+        local time, price, units = tonumber(ARGV[i]), ARGV[i + 1], ARGV[i + 2]
+        local open_time = time - time % seconds
+        local bar = redis.call('HMGET', KEYS[k], 'open_time', 'open', 'high', 'low', 'close', 'volume', 'trades')
+        local current = tonumber(bar[1])
+        if current ~= nil and open_time < current then
+            table.insert(result, {k, 'late', open_time, price, price, price, price, units, 1})
+        else
+            if current ~= nil and open_time > current then
+                table.insert(result, {k, 'closed', current, bar[2], bar[3], bar[4], bar[5], bar[6], bar[7]})
+                redis.call('DEL', KEYS[k])
+                current = nil
+            end
+            if current == nil then
+                redis.call('HSET', KEYS[k], 'open_time', open_time, 'open', price, 'high', price, 'low', price)
+            else
+                if tonumber(price) > tonumber(bar[3]) then
+                    redis.call('HSET', KEYS[k], 'high', price)
+                end
+                if tonumber(price) < tonumber(bar[4]) then
+                    redis.call('HSET', KEYS[k], 'low', price)
+                end
+            end
+            redis.call('HSET', KEYS[k], 'close', price)
+            redis.call('HINCRBY', KEYS[k], 'volume', units)
+            redis.call('HINCRBY', KEYS[k], 'trades', 1)
+        end
+    end
+end
+return result
+"""
+
+
+class CandleService:
+    """
+    incremental 1m / 5m / 1h / 1d ohlcv bars per market , fed with the trades of the matching engine.
+    open bars are redis hashes updated by one Lua script per match , a bar is flushed to the
+    Candle table once a trade of the next period arrives , so candle reads never scan Trade.
+    """
+
+    def __init__(self):
+        self.redis_client = get_redis_client()
+        self.apply_trades_script = self.redis_client.register_script(APPLY_TRADES)
+
+    def add_trades(self, market_id: int, trades):
+        """
+        fold the trades of one match into the open bars of the market and write the closed bars.
+        """
+        if not trades:
+            return
+
+        try:
+            market_symbol = market_registry.get_by_id(market_id).symbol
+            result = self.queue_trades(self.redis_client, market_symbol, trades)
+            self.flush(market_id, result)
+
+        except Exception as e:
+            print(f"Error adding trades to candles of market {market_id}: {str(e)}")
+
+    def queue_trades(self, client, market_symbol: str, trades):
+        """
+        run (or queue on client when it is a pipeline) the script call folding the trades ,
+        its result is then passed to flush.
+        """
+        args = list(INTERVALS.values())
+        for trade in trades:
+            args.extend([int(trade.created_at.timestamp()), str(trade.price), self._to_units(trade.amount)])
+        return self.apply_trades_script(
+            keys=[self._get_open_key(market_symbol, interval) for interval in INTERVALS],
+            args=args,
+            client=client
+        )
+
+    def get_candles(self, market_symbol: str, interval: str, start: datetime = None, end: datetime = None, limit: int = 500):
+        """
+        bars of a market in [start, end) , oldest first: the closed bars from postgres
+        (one range read on the unique index) and the open bar from redis.
+        """
+        market = market_registry.get(market_symbol)
+        queryset = Candle.objects.filter(market_id=market.id, interval=interval)
+        if start is not None:
+            queryset = queryset.filter(open_time__gte=start)
+        if end is not None:
+            queryset = queryset.filter(open_time__lt=end)
+        rows = queryset.order_by('-open_time').values_list(
+            'open_time', 'open', 'high', 'low', 'close', 'volume', 'trades'
+        )[:limit]
+        candles = [self._get_candle_data(*row, closed=True) for row in list(rows)[::-1]]
+
+        open_bar = self.get_open_candle(market_symbol, interval)
+        if open_bar is not None:
+            open_time = open_bar["open_time"]
+            if (start is None or open_time >= start) and (end is None or open_time < end) \
+                    and (not candles or open_time > candles[-1]["open_time"]):
+                candles = (candles + [open_bar])[-limit:]
+
+        for candle in candles:
+            candle["open_time"] = candle["open_time"].isoformat()
+        return candles
+
+    def get_open_candle(self, market_symbol: str, interval: str):
+        """
+        current bar of the interval from redis , None before the first trade.
+        a quiet market keeps its last bar in redis until the next trade , it is reported closed once its period ended.
+        """
+        bar = self.redis_client.hgetall(self._get_open_key(market_symbol, interval))
+        if not bar:
+            return None
+        open_time = self._to_datetime(bar['open_time'])
+        return self._get_candle_data(
+            open_time, Decimal(bar['open']), Decimal(bar['high']), Decimal(bar['low']),
+            Decimal(bar['close']), self._from_units(bar['volume']), int(bar['trades']),
+            closed=open_time + timedelta(seconds=INTERVALS[interval]) <= timezone.now()
+        )
+
+    def reset_candles(self, market_symbol: str):
+        """
+        drop every bar of the market (before a rebuild from the trade history).
+        """
+        market = market_registry.get(market_symbol)
+        self.redis_client.delete(*[self._get_open_key(market_symbol, interval) for interval in INTERVALS])
+        Candle.objects.filter(market_id=market.id).delete()
+
+    def flush(self, market_id: int, result):
+        """
+        write the bars returned by the script: closed bars are inserted with one query , late trades are merged into their bar.
+        """
+        names = list(INTERVALS)
+        closed = []
+        late = []
+        for index, kind, open_time, open_price, high, low, close, units, count in result:
+            candle = Candle(
+                market_id=market_id,
+                interval=names[int(index) - 1],
+                open_time=self._to_datetime(open_time),
+                open=Decimal(open_price),
+                high=Decimal(high),
+                low=Decimal(low),
+                close=Decimal(close),
+                volume=self._from_units(units),
+                trades=int(count)
+            )
+            (closed if kind == 'closed' else late).append(candle)
+
+        if closed:
+            Candle.objects.bulk_create(closed, ignore_conflicts=True)
+        #a late trade may belong to a bar closed by the same call , so it is merged after the insert
+        for candle in late:
+            self._merge_late_trade(candle)
+
+    def _merge_late_trade(self, candle: Candle):
+        """
+        merge a late trade into its bar , or open the bar with it when no trade of that period was flushed yet.
+        """
+        bar = Candle.objects.filter(market_id=candle.market_id, interval=candle.interval, open_time=candle.open_time)
+        merge = dict(
+            high=Greatest(F('high'), Value(candle.high)),
+            low=Least(F('low'), Value(candle.low)),
+            volume=F('volume') + candle.volume,
+            trades=F('trades') + candle.trades
+        )
+        if bar.update(**merge):
+            return
+        with transaction.atomic():
+            #get_or_create falls back to the row a concurrent flush inserted first
+            _, created = Candle.objects.get_or_create(
+                market_id=candle.market_id, interval=candle.interval, open_time=candle.open_time,
+                defaults=dict(open=candle.open, high=candle.high, low=candle.low, close=candle.close, volume=candle.volume, trades=candle.trades)
+            )
+            if not created:
+                bar.update(**merge)
+
+    def _get_candle_data(self, open_time, open_price, high, low, close, volume, trades, closed: bool):
+        return {
+            "open_time": open_time,
+            "open": float(open_price),
+            "high": float(high),
+            "low": float(low),
+            "close": float(close),
+            "volume": float(volume),
+            "trades": trades,
+            "closed": closed
+        }
+
+    def _get_open_key(self, market_symbol: str, interval: str) -> str:
+        return f"candles:{market_symbol}:{interval}"
+
+    def _to_datetime(self, timestamp) -> datetime:
+        return datetime.fromtimestamp(int(timestamp), tz=dt_timezone.utc)
+
+    def _to_units(self, amount: Decimal) -> int:
+        return int(amount * VOLUME_UNITS)
+
+    def _from_units(self, units) -> Decimal:
+        return Decimal(int(units)) / VOLUME_UNITS
+
+
+"""
+using singleton pattern
+"""
+candle_service = CandleService()
@@ -0,0 +1,50 @@
+from decimal import Decimal
+
+#largest value of a signed 64-bit integer , prices and amounts of the books must fit in it
+INT64_MAX = 2 ** 63 - 1
+
+
+class FixedPoint:
+    """
+    fixed-point scale of one market: prices are integer ticks and amounts are integer lots.
+    the in-memory books and the matching only use these integers , Decimal values exist at the
+    db / api / redis boundary only.
+    """
+    __slots__ = ('tick_size', 'lot_size')
+
+    def __init__(self, tick_size: Decimal, lot_size: Decimal):
+        self.tick_size = Decimal(tick_size)
+        self.lot_size = Decimal(lot_size)
+
+    def to_ticks(self, price: Decimal) -> int:
+        return self._scale(price, self.tick_size, 'price')
+
+    def to_lots(self, amount: Decimal) -> int:
+        return self._scale(amount, self.lot_size, 'amount')
+
+    def price(self, ticks: int) -> Decimal:
+        return ticks * self.tick_size
+
+    def amount(self, lots: int) -> Decimal:
+        return lots * self.lot_size
+
+    def _scale(self, value: Decimal, size: Decimal, name: str) -> int:
+        units = value / size
+        integral = units.to_integral_value()
+        if units != integral:
+            raise ValueError(f"{name} {value} is not a multiple of {size}")
+        if abs(integral) > INT64_MAX:
+            raise ValueError(f"{name} {value} does not fit in 64 bits with a step of {size}")
+        return int(integral)
+
+    def __eq__(self, other):
+        return isinstance(other, FixedPoint) and (self.tick_size, self.lot_size) == (other.tick_size, other.lot_size)
+
+    def __hash__(self):
+        return hash((self.tick_size, self.lot_size))
+
+
+#default tick and lot size of a market , the precision of the order amount columns
+DEFAULT_TICK_SIZE = Decimal('0.00000001')
+DEFAULT_LOT_SIZE = Decimal('0.00000001')
+DEFAULT_SCALE = FixedPoint(DEFAULT_TICK_SIZE, DEFAULT_LOT_SIZE)
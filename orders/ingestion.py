@@ -0,0 +1,139 @@
+import redis
+import socket
+from decimal import Decimal
+from django.conf import settings
+from orders.services import engine
+from currencies.registry import market_registry
+from core.redis_pool import get_redis_client
+
+
+class OrderIngestionService:
+    """
+    queue of matching commands (new orders and cancels) kept in one Redis stream per market.
+    the api only appends to the stream, a single matcher consumer per market reads it
+    and runs the engine sequentially, so api replicas can scale without racing each other.
+    the matcher of a shard holds the shard lock (see ShardRouter.lock_shard) , so its consumer name is stable
+    and a matcher taking over after a crash replays the pending commands of the previous one.
+    """
+
+    group_name = 'matcher'
+
+    def __init__(self):
+        self.redis_client = get_redis_client()
+        self.consumer_name = socket.gethostname()
+
+    def is_async(self) -> bool:
+        return settings.ORDER_INGESTION_MODE == 'async'
+
+    def enqueue_order(self, order):
+        """
+        queue a saved order for matching.
+        """
+        return self._enqueue(market_registry.get_by_id(order.target_market_id).symbol, {'command': 'process', 'order_id': order.id})
+
+    def enqueue_orders(self, orders):
+        """
+        queue a batch of saved orders , in one pipeline and in list order.
+        """
+        pipe = self.redis_client.pipeline(transaction=False)
+        for order in orders:
+            self._enqueue(market_registry.get_by_id(order.target_market_id).symbol, {'command': 'process', 'order_id': order.id}, client=pipe)
+        return pipe.execute()
+
+    def enqueue_cancel(self, order):
+        """
+        queue the cancel of a resting order, so it is applied in order with the matching.
+        """
+        return self._enqueue(market_registry.get_by_id(order.target_market_id).symbol, {'command': 'cancel', 'order_id': order.id})
+
+    def enqueue_amend(self, order, price=None, amount=None):
+        """
+        queue a new price and/or amount of a resting order ('' keeps the current value).
+        """
+        return self._enqueue(market_registry.get_by_id(order.target_market_id).symbol, {
+            'command': 'amend',
+            'order_id': order.id,
+            'price': '' if price is None else str(price),
+            'amount': '' if amount is None else str(amount)
+        })
+
+    def enqueue_cancel_orders(self, market_id: int, order_ids=None, side: str = None):
+        """
+        queue a bulk cancel of a market (the given ids , else all resting orders of the market or of one side).
+        """
+        return self._enqueue(market_registry.get_by_id(market_id).symbol, {
+            'command': 'cancel_orders',
+            'market_id': market_id,
+            #'*' cancels every resting order of the market (or side)
+            'order_ids': ','.join(str(order_id) for order_id in order_ids) if order_ids is not None else '*',
+            'order_side': side or ''
+        })
+
+    def consume(self, market_symbols, block: int = None, count: int = 100) -> int:
+        """
+        read one batch of commands of the given markets and apply them in stream order.
+        pending commands of this consumer (left by a crash) are replayed first.
+        returns the number of handled commands.
+        """
+        streams = [self._get_stream_key(symbol) for symbol in market_symbols]
+        for stream in streams:
+            self._ensure_group(stream)
+
+        handled = self._read(dict.fromkeys(streams, '0'), None, count)
+        handled += self._read(dict.fromkeys(streams, '>'), block, count)
+        return handled
+
+    def _read(self, streams, block, count) -> int:
+        handled = 0
+        response = self.redis_client.xreadgroup(self.group_name, self.consumer_name, streams, count=count, block=block)
+        for stream, entries in response or []:
+            for entry_id, fields in entries:
+                self._handle(fields)
+                self.redis_client.xack(stream, self.group_name, entry_id)
+                handled += 1
+            if entries:
+                self._trim(stream, entries[-1][0])
+        return handled
+
+    def _trim(self, stream: str, handled_id: str):
+        """
+        drop the commands before the last handled one. the single consumer of the shard handles and acks
+        in stream order , so nothing before it is pending and no queued command is ever trimmed.
+        """
+        self.redis_client.xtrim(stream, minid=handled_id, approximate=False)
+
+    def _handle(self, fields):
+        if fields['command'] == 'cancel_orders':
+            order_ids = None if fields['order_ids'] == '*' else [int(order_id) for order_id in fields['order_ids'].split(',') if order_id]
+            return engine.cancel_orders(int(fields['market_id']), order_ids, fields['order_side'] or None)
+        order_id = int(fields['order_id'])
+        if fields['command'] == 'cancel':
+            return engine.cancel_order(order_id)
+        if fields['command'] == 'amend':
+            return engine.amend_order(
+                order_id,
+                Decimal(fields['price']) if fields['price'] else None,
+                Decimal(fields['amount']) if fields['amount'] else None
+            )
+        return engine.process_order(order_id)
+
+    def _enqueue(self, market_symbol: str, fields, client=None):
+        #no MAXLEN here , it could trim commands not matched yet (the matcher trims what it handled)
+        return (client or self.redis_client).xadd(self._get_stream_key(market_symbol), fields)
+
+    def _ensure_group(self, stream: str):
+        try:
+            self.redis_client.xgroup_create(stream, self.group_name, id='0', mkstream=True)
+        except redis.ResponseError as e:
+            #the group already exists
+            if 'BUSYGROUP' not in str(e):
+                raise
+
+    def _get_stream_key(self, market_symbol: str) -> str:
+        return f"matcher:commands:{market_symbol}"
+
+
+"""
+using singleton pattern
+"""
+order_ingestion = OrderIngestionService()
@@ -0,0 +1,396 @@
+import os
+import mmap
+import struct
+import zlib
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+from django.conf import settings
+from orders.models import Order
+from orders.book import BookEntry, MarketBook
+
+#record types
+ORDER = 1   #process command of a taker (write-ahead)
+CANCEL = 2  #cancel command (write-ahead)
+FILL = 3    #one trade of a committed command
+DONE = 4    #a command is committed , carries the final state of its order
+RESET = 5   #start of a market book checkpoint (seeded from postgres)
+REST = 6    #one resting order of a checkpoint
+AMEND = 7   #new price / amount of a resting order (write-ahead) , a new created_at means it was requeued
+
+SIDES = (Order.OrderSide.BUY, Order.OrderSide.SELL)
+ORDER_TYPES = (Order.OrderType.MARKET, Order.OrderType.LIMIT)
+
+#record frame: payload length , crc32 of the payload
+FRAME = struct.Struct('<II')
+HEADER = struct.Struct('<Bq')  #type , market id
+
+
+class Journal:
+    """
+    append-only binary journal of the matcher, written to memory-mapped segment files.
+    a record is a (length, crc32) frame followed by its payload, a zero length marks the end of a segment.
+    segments are named by the journal offset of their first byte, so offsets are global and ordered.
+    only one process (a matcher shard) may write to a journal directory.
+    segments before the oldest kept engine snapshot are deleted after every snapshot (see prune).
+    """
+
+    suffix = '.journal'
+
+    def __init__(self, directory: str, segment_size: int = None, fsync: bool = None):
+        self.directory = directory
+        self.segment_size = segment_size or settings.JOURNAL_SEGMENT_SIZE
+        self.fsync = settings.JOURNAL_FSYNC if fsync is None else fsync
+        os.makedirs(directory, exist_ok=True)
+        self.file = None
+        self.map = None
+        #continue after the last valid record of the last segment , a torn tail is overwritten
+        segments = self._segments()
+        self.base = segments[-1] if segments else 0
+        self.position = 0
+        for offset, payload in self.read(self.base):
+            self.position = offset - self.base + FRAME.size + len(payload)
+
+    @property
+    def offset(self) -> int:
+        """
+        journal offset of the next record.
+        """
+        return self.base + self.position
+
+    def append(self, *payloads) -> int:
+        """
+        append records written back to back (a segment is never split inside one call).
+        returns the offset after the last record.
+        """
+        if not payloads:
+            return self.offset
+        frames = frame_records(payloads)
+        #keep room for the zero length end marker
+        if self.position + len(frames) + FRAME.size > self.segment_size:
+            if self.position == 0:
+                raise ValueError(f"journal records of {len(frames)} bytes do not fit in a segment")
+            self.close()
+            self.base, self.position = self.offset, 0
+        if self.map is None:
+            self._open_segment()
+        #records and the end marker after them
+        self.map[self.position:self.position + len(frames) + FRAME.size] = frames + FRAME.pack(0, 0)
+        self.position += len(frames)
+        if self.fsync:
+            self.map.flush()
+        return self.offset
+
+    def extend(self, payloads, batch: int = 1024) -> int:
+        """
+        append a long run of records (a book checkpoint) in batches, it may span segments.
+        """
+        payloads = list(payloads)
+        for start in range(0, len(payloads), batch):
+            self.append(*payloads[start:start + batch])
+        return self.offset
+
+    def read(self, from_offset: int = 0):
+        """
+        yield (offset, payload) of every valid record from the given offset.
+        reading stops at the first torn or corrupted record.
+        """
+        for base in self._segments():
+            if self._next_base(base) <= from_offset:
+                continue
+            with open(self._path(base), 'rb') as file:
+                data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+                try:
+                    for position, payload in scan_records(data):
+                        if base + position >= from_offset:
+                            yield base + position, payload
+                finally:
+                    data.close()
+
+    def prune(self, before_offset: int) -> int:
+        """
+        delete the segments that end at or before the given offset (covered by a snapshot).
+        the segment being written is never deleted. returns the number of deleted segments.
+        """
+        segments = self._segments()
+        deleted = 0
+        for base, next_base in zip(segments, segments[1:]):
+            if next_base > before_offset or base == self.base:
+                break
+            os.remove(self._path(base))
+            deleted += 1
+        return deleted
+
+    def close(self):
+        if self.map is not None:
+            self.map.flush()
+            self.map.close()
+            self.file.close()
+            self.map = None
+
+    def _open_segment(self):
+        #segments are preallocated , the map is only opened by the writer
+        path = self._path(self.base)
+        self.file = open(path, 'a+b')
+        if os.path.getsize(path) < self.segment_size:
+            self.file.truncate(self.segment_size)
+        self.map = mmap.mmap(self.file.fileno(), self.segment_size)
+
+    def _next_base(self, base: int) -> int:
+        segments = self._segments()
+        index = segments.index(base)
+        return segments[index + 1] if index + 1 < len(segments) else float('inf')
+
+    def _segments(self):
+        return sorted(
+            int(name[:-len(self.suffix)])
+            for name in os.listdir(self.directory)
+            if name.endswith(self.suffix)
+        )
+
+    def _path(self, base: int) -> str:
+        return os.path.join(self.directory, f"{base:020d}{self.suffix}")
+
+
+def frame_records(payloads) -> bytes:
+    return b''.join(FRAME.pack(len(payload), zlib.crc32(payload)) + payload for payload in payloads)
+
+
+def scan_records(data):
+    """
+    yield (position, payload) of the framed records in data , up to the end marker or a bad record.
+    """
+    position = 0
+    while position + FRAME.size <= len(data):
+        length, checksum = FRAME.unpack_from(data, position)
+        start = position + FRAME.size
+        if length == 0 or start + length > len(data):
+            return
+        payload = bytes(data[start:start + length])
+        if zlib.crc32(payload) != checksum:
+            return
+        yield position, payload
+        position = start + length
+
+
+def _pack_decimal(value: Decimal) -> bytes:
+    text = str(value).encode()
+    return struct.pack('<B', len(text)) + text
+
+
+def _unpack_decimal(payload: bytes, position: int):
+    length = payload[position]
+    return Decimal(payload[position + 1:position + 1 + length].decode()), position + 1 + length
+
+
+def _pack_time(value) -> bytes:
+    return struct.pack('<d', value.timestamp() if value else 0.0)
+
+
+def _unpack_time(payload: bytes, position: int):
+    value, = struct.unpack_from('<d', payload, position)
+    return (datetime.fromtimestamp(value, dt_timezone.utc) if value else None), position + 8
+
+
+def encode_order(order: Order) -> bytes:
+    return _encode_command(ORDER, order)
+
+
+def encode_amend(order: Order) -> bytes:
+    return _encode_command(AMEND, order)
+
+
+def _encode_command(record_type: int, order: Order) -> bytes:
+    return (
+        HEADER.pack(record_type, order.target_market_id)
+        + struct.pack('<qBB', order.id, SIDES.index(order.order_side), ORDER_TYPES.index(order.order_type))
+        + _pack_time(order.created_at)
+        + _pack_decimal(order.price)
+        + _pack_decimal(order.amount)
+        + _pack_decimal(order.filled_amount or Decimal('0'))
+    )
+
+
+def encode_cancel(order: Order) -> bytes:
+    return HEADER.pack(CANCEL, order.target_market_id) + struct.pack('<q', order.id)
+
+
+def encode_fill(market_id: int, taker_id: int, maker_id: int, price: Decimal, amount: Decimal) -> bytes:
+    return (
+        HEADER.pack(FILL, market_id)
+        + struct.pack('<qq', taker_id, maker_id)
+        + _pack_decimal(price)
+        + _pack_decimal(amount)
+    )
+
+
+def encode_done(order: Order, resting: bool) -> bytes:
+    return (
+        HEADER.pack(DONE, order.target_market_id)
+        + struct.pack('<qB', order.id, resting)
+        + _pack_decimal(order.filled_amount or Decimal('0'))
+        + _pack_decimal(order.remaining_amount)
+    )
+
+
+def encode_reset(market_id: int) -> bytes:
+    return HEADER.pack(RESET, market_id)
+
+
+def encode_rest(market_id: int, entry: BookEntry) -> bytes:
+    return (
+        HEADER.pack(REST, market_id)
+        + struct.pack('<qB', entry.id, SIDES.index(entry.side))
+        + _pack_time(entry.created_at)
+        + _pack_decimal(entry.price)
+        + _pack_decimal(entry.amount)
+        + _pack_decimal(entry.filled_amount)
+        + _pack_decimal(entry.remaining_amount)
+    )
+
+
+def encode_checkpoint(book: MarketBook):
+    """
+    records that reset a market book to its current content.
+    """
+    records = [encode_reset(book.market_id)]
+    for side in (book.buy, book.sell):
+        records.extend(encode_rest(book.market_id, entry) for entry in side.iter_entries())
+    return records
+
+
+def decode(payload: bytes):
+    """
+    (record type, market id, fields) of a journal record.
+    """
+    record_type, market_id = HEADER.unpack_from(payload)
+    position = HEADER.size
+    if record_type in (ORDER, AMEND):
+        order_id, side, order_type = struct.unpack_from('<qBB', payload, position)
+        created_at, position = _unpack_time(payload, position + 10)
+        price, position = _unpack_decimal(payload, position)
+        amount, position = _unpack_decimal(payload, position)
+        filled, position = _unpack_decimal(payload, position)
+        return record_type, market_id, {
+            'order_id': order_id, 'side': SIDES[side], 'order_type': ORDER_TYPES[order_type],
+            'created_at': created_at, 'price': price, 'amount': amount, 'filled_amount': filled
+        }
+    if record_type == CANCEL:
+        order_id, = struct.unpack_from('<q', payload, position)
+        return record_type, market_id, {'order_id': order_id}
+    if record_type == FILL:
+        taker_id, maker_id = struct.unpack_from('<qq', payload, position)
+        price, position = _unpack_decimal(payload, position + 16)
+        amount, position = _unpack_decimal(payload, position)
+        return record_type, market_id, {'taker_id': taker_id, 'maker_id': maker_id, 'price': price, 'amount': amount}
+    if record_type == DONE:
+        order_id, resting = struct.unpack_from('<qB', payload, position)
+        filled, position = _unpack_decimal(payload, position + 9)
+        remaining, position = _unpack_decimal(payload, position)
+        return record_type, market_id, {
+            'order_id': order_id, 'resting': bool(resting), 'filled_amount': filled, 'remaining_amount': remaining
+        }
+    if record_type == RESET:
+        return record_type, market_id, {}
+    if record_type == REST:
+        order_id, side = struct.unpack_from('<qB', payload, position)
+        created_at, position = _unpack_time(payload, position + 9)
+        price, position = _unpack_decimal(payload, position)
+        amount, position = _unpack_decimal(payload, position)
+        filled, position = _unpack_decimal(payload, position)
+        remaining, position = _unpack_decimal(payload, position)
+        #the entry is built by the replay , with the scale of its market
+        return record_type, market_id, {
+            'order_id': order_id, 'side': SIDES[side], 'created_at': created_at, 'price': price, 'amount': amount,
+            'filled_amount': filled, 'remaining_amount': remaining
+        }
+    raise ValueError(f"unknown journal record type {record_type}")
+
+
+class JournalReplay:
+    """
+    rebuild market books from a journal without touching postgres.
+    fills are applied when the DONE record of their command is read, so a command
+    cut by a crash leaves no partial effect and is reported in `incomplete`.
+    only markets with a checkpoint (RESET) in the journal are rebuilt.
+    """
+
+    def __init__(self, books=None, scales=None):
+        self.books = books if books is not None else {}
+        #market id -> fixed-point scale of the rebuilt books (the market registry scales ,
+        #a market with a tick below the default one can not be read with DEFAULT_SCALE)
+        self.scales = scales
+        self.commands = {}
+        self.fills = {}
+        self.records = 0
+        self.offset = 0
+
+    @property
+    def incomplete(self):
+        """
+        (market id, order id, command type) of the commands without a DONE record.
+        """
+        return [(command['market_id'], order_id, command['command']) for order_id, command in self.commands.items()]
+
+    def run(self, journal: Journal, from_offset: int = 0):
+        self.offset = from_offset
+        for offset, payload in journal.read(from_offset):
+            self.apply(*decode(payload))
+            self.records += 1
+            self.offset = offset + FRAME.size + len(payload)
+        return self
+
+    def apply(self, record_type: int, market_id: int, fields: dict):
+        if record_type == RESET:
+            self.books[market_id] = MarketBook(market_id, self.scales(market_id)) if self.scales else MarketBook(market_id)
+        elif record_type == REST:
+            book = self.books.get(market_id)
+            if book is not None:
+                book.add(BookEntry(
+                    fields['order_id'], fields['side'], fields['price'], fields['amount'],
+                    fields['filled_amount'], fields['remaining_amount'], fields['created_at'], book.scale
+                ))
+        elif record_type in (ORDER, CANCEL, AMEND):
+            self.commands[fields['order_id']] = dict(fields, market_id=market_id, command=record_type)
+            self.fills.pop(fields['order_id'], None)
+        elif record_type == FILL:
+            self.fills.setdefault(fields['taker_id'], []).append(fields)
+        elif record_type == DONE:
+            self._apply_done(market_id, fields)
+
+    def _apply_done(self, market_id: int, fields: dict):
+        order_id = fields['order_id']
+        command = self.commands.pop(order_id, None)
+        fills = self.fills.pop(order_id, [])
+        book = self.books.get(market_id)
+        if book is None:
+            return
+
+        for fill in fills:
+            maker = book.orders.get(fill['maker_id'])
+            if maker is None:
+                continue
+            lots = book.scale.to_lots(fill['amount'])
+            maker.filled_lots += lots
+            maker.lots -= lots
+            if maker.lots <= 0:
+                book.remove(maker.id)
+
+        if not fields['resting']:
+            book.remove(order_id)
+            return
+        current = book.orders.get(order_id)
+        if current is not None and command is not None and command['command'] == AMEND:
+            if current.ticks != book.scale.to_ticks(command['price']) or current.created_at != command['created_at']:
+                #requeued at the back of its (new) price level
+                book.remove(order_id)
+                current = None
+            else:
+                current.amount = command['amount']
+        if current is None and command is not None and command['command'] in (ORDER, AMEND):
+            book.upsert(BookEntry(
+                order_id, command['side'], command['price'], command['amount'],
+                fields['filled_amount'], fields['remaining_amount'], command['created_at'], book.scale
+            ))
+        elif current is not None:
+            current.filled_amount = fields['filled_amount']
+            current.remaining_amount = fields['remaining_amount']
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from currencies.models import Market
+from orders.models import Trade
+from orders.candles import candle_service
+
+
+class Command(BaseCommand):
+    help = "Rebuild the candles of markets from their trade history (one time backfill , the engine keeps them up to date)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('market_symbols', nargs='*', help="markets to rebuild (default: all markets)")
+        parser.add_argument('--chunk-size', type=int, default=1000, help="trades folded per script call")
+
+    def handle(self, *args, **options):
+        markets = Market.objects.all()
+        if options['market_symbols']:
+            markets = markets.filter(symbol__in=options['market_symbols'])
+
+        for market in markets:
+            candle_service.reset_candles(market.symbol)
+            #walks trade_market_created_idx in time order
+            trades = Trade.objects.filter(trade_market=market).order_by('created_at', 'id').only(
+                'price', 'amount', 'created_at', 'trade_market'
+            )
+            chunk, count = [], 0
+            for trade in trades.iterator(chunk_size=options['chunk_size']):
+                chunk.append(trade)
+                if len(chunk) >= options['chunk_size']:
+                    candle_service.add_trades(market.id, chunk)
+                    count += len(chunk)
+                    chunk = []
+            candle_service.add_trades(market.id, chunk)
+            count += len(chunk)
+            self.stdout.write(f"{market.symbol}: {count} trades folded into candles")
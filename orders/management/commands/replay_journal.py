@@ -0,0 +1,55 @@
+import os
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from orderbook.services import order_book_service
+from currencies.registry import market_registry
+from orders.journal import Journal, JournalReplay
+from orders.snapshots import EngineSnapshots
+from orders.services import engine
+
+
+class Command(BaseCommand):
+    help = "Rebuild the market books from a matcher journal (offline replay , benchmarking , recovery)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', nargs='?', default=settings.MATCHING_JOURNAL_DIR, help="journal directory of one shard")
+        parser.add_argument('--from-offset', type=int, default=0, help="journal offset to start from")
+        parser.add_argument('--snapshot', action='store_true', help="start from the newest engine snapshot of the journal")
+        parser.add_argument('--redis', action='store_true', help="write the rebuilt books to Redis")
+        parser.add_argument('--compare', action='store_true', help="also time seeding the same books from postgres")
+
+    def handle(self, *args, **options):
+        if not options['directory']:
+            raise CommandError("no journal directory given and MATCHING_JOURNAL_DIR is not set")
+
+        journal = Journal(options['directory'])
+        started = time.perf_counter()
+        books, offset = {}, options['from_offset']
+        if options['snapshot']:
+            books, offset = EngineSnapshots(os.path.join(options['directory'], 'snapshots')).load_latest(engine._get_scale)
+        replay = JournalReplay(books, engine._get_scale).run(journal, offset)
+        elapsed = time.perf_counter() - started
+
+        resting = sum(len(book.orders) for book in replay.books.values())
+        rate = replay.records / elapsed if elapsed else 0
+        self.stdout.write(
+            f"Replayed {replay.records} records up to offset {replay.offset} in {elapsed:.3f}s ({rate:.0f} records/s): "
+            f"{len(replay.books)} markets , {resting} resting orders , {len(replay.incomplete)} incomplete commands"
+        )
+
+        if options['redis']:
+            for market_id, book in replay.books.items():
+                market = market_registry.get_by_id(market_id)
+                if market is None:
+                    continue
+                order_book_service.replace_order_book(
+                    market.symbol, list(book.buy.iter_entries()) + list(book.sell.iter_entries())
+                )
+            self.stdout.write(f"Wrote {len(replay.books)} books to Redis")
+
+        if options['compare']:
+            started = time.perf_counter()
+            for market_id in replay.books:
+                engine._load_book(market_id)
+            self.stdout.write(f"Seeding the same books from postgres took {time.perf_counter() - started:.3f}s")
@@ -0,0 +1,89 @@
+import os
+import time
+import socket
+import multiprocessing
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from currencies.models import Market
+from orders.ingestion import order_ingestion
+from orders.journal import Journal
+from orders.snapshots import EngineSnapshots
+from orders.services import engine
+from orders.sharding import shard_router
+
+
+def run_shard(shard: int, block: int):
+    """
+    single-writer loop of one shard: match the queued commands of the markets it owns,
+    and pick up new markets whenever the shard version changes.
+    """
+    #one matcher per shard across all hosts , the others wait here until the holder dies
+    lock = shard_router.lock_shard(shard)
+    print(f"Shard {shard} waiting for its lock on {socket.gethostname()} (pid {os.getpid()})")
+    lock.acquire()
+    #the same name for every holder of the lock , so the next one replays the pending commands of a crashed one
+    order_ingestion.consumer_name = f"matcher-shard-{shard}"
+    #this process is the only writer of the markets of the shard , so it may match from memory
+    engine.single_writer = True
+    version = None
+    market_symbols = []
+    journal = None
+    snapshots = None
+    if settings.MATCHING_JOURNAL_DIR:
+        journal = Journal(os.path.join(settings.MATCHING_JOURNAL_DIR, f"shard-{shard}"))
+        snapshots = EngineSnapshots(os.path.join(journal.directory, 'snapshots'))
+    snapshot_at = time.monotonic()
+
+    while True:
+        #raises once the lock expired and was taken over , this process must stop writing
+        lock.reacquire()
+        current_version = shard_router.get_version()
+        if current_version != version:
+            version = current_version
+            markets = Market.objects.values_list('id', 'symbol')
+            owned = {symbol: market_id for market_id, symbol in markets if shard_router.shard_for(symbol) == shard}
+            if journal is not None and engine.journal is None:
+                #restore the books from the last snapshot and journal of this shard , then keep journaling
+                replay = engine.restore_books(journal, set(owned.values()), snapshots)
+                print(f"Shard {shard} replayed {replay.records} journal records")
+                engine.attach_journal(journal)
+            #seed only the books this process does not hold yet
+            engine.load_books([market_id for market_id in owned.values() if market_id not in engine.books])
+            market_symbols = list(owned)
+            print(f"Shard {shard} owns {', '.join(market_symbols) or 'no markets'}")
+
+        if market_symbols:
+            order_ingestion.consume(market_symbols, block=block)
+        else:
+            time.sleep(block / 1000)
+
+        #between two batches no command is half applied
+        if snapshots is not None and time.monotonic() - snapshot_at >= settings.ENGINE_SNAPSHOT_INTERVAL:
+            engine.write_snapshot(snapshots)
+            snapshot_at = time.monotonic()
+
+
+class Command(BaseCommand):
+    help = "Run the single-writer matchers, one process per shard, each owning the markets hashed to it."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shard', type=int, help="run only this shard in the current process")
+        parser.add_argument('--block', type=int, default=settings.MATCHER_BLOCK_MS, help="max wait in ms for new commands")
+
+    def handle(self, *args, **options):
+        if options['shard'] is not None:
+            return run_shard(options['shard'], options['block'])
+
+        #forked children must not share the parent's database connection
+        connections.close_all()
+        processes = [
+            multiprocessing.Process(target=run_shard, args=(shard, options['block']), name=f"matcher-shard-{shard}")
+            for shard in range(shard_router.shards)
+        ]
+        for process in processes:
+            process.start()
+        self.stdout.write(f"Started {len(processes)} matcher shards")
+
+        for process in processes:
+            process.join()
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.18 on 2026-10-18 03:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0002_remove_order_high_limit_remove_order_low_limit'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('order_state__in', ['waiting', 'partially_filled']), ('remaining_amount__gt', 0)), fields=['target_market', 'order_side', 'price', 'created_at'], include=('amount', 'filled_amount', 'remaining_amount'), name='order_resting_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trade',
+            index=models.Index(fields=['trade_market', 'created_at'], name='trade_market_created_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.18 on 2026-10-18 04:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('currencies', '0002_market_tick_lot_size'),
+        ('orders', '0003_order_trade_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Candle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('interval', models.CharField(choices=[('1m', '1 Minute'), ('5m', '5 Minutes'), ('1h', '1 Hour'), ('1d', '1 Day')], max_length=2)),
+                ('open_time', models.DateTimeField()),
+                ('open', models.DecimalField(decimal_places=16, max_digits=40)),
+                ('high', models.DecimalField(decimal_places=16, max_digits=40)),
+                ('low', models.DecimalField(decimal_places=16, max_digits=40)),
+                ('close', models.DecimalField(decimal_places=16, max_digits=40)),
+                ('volume', models.DecimalField(decimal_places=8, max_digits=40)),
+                ('trades', models.PositiveIntegerField(default=0)),
+                ('market', models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, related_name='market_candles', to='currencies.market')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='candle',
+            constraint=models.UniqueConstraint(fields=('market', 'interval', 'open_time'), name='candle_market_interval_time_uniq'),
+        ),
+    ]
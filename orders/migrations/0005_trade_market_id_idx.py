@@ -0,0 +1,17 @@
+# Generated by Django 4.2.18 on 2026-10-18 04:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_candle'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='trade',
+            index=models.Index(fields=['trade_market', 'id'], name='trade_market_id_idx'),
+        ),
+    ]
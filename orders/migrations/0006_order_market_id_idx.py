@@ -0,0 +1,17 @@
+# Generated by Django 4.2.18 on 2026-10-18 04:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_trade_market_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['target_market', 'id'], name='order_market_id_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.18 on 2026-10-18 04:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_order_market_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('order_side', 'buy'), ('order_state__in', ['waiting', 'partially_filled']), ('remaining_amount__gt', 0)), fields=['target_market', '-price', 'created_at'], include=('amount', 'filled_amount', 'remaining_amount'), name='order_resting_bid_idx'),
+        ),
+    ]
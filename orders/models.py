@@ -40,6 +40,28 @@ class Order(BaseModel):
     def __str__(self):
         return f"{self.pk} : {self.target_market.base_currency}/{self.target_market.quote_currency}"
     
+    class Meta:
+        indexes = [
+            # resting order lookup of the matching engine and order book (active orders only) ,
+            # in ask order (price , created_at)
+            models.Index(
+                fields=['target_market', 'order_side', 'price', 'created_at'],
+                name='order_resting_idx',
+                condition=models.Q(order_state__in=['waiting', 'partially_filled'], remaining_amount__gt=0),
+                include=['amount', 'filled_amount', 'remaining_amount'],
+            ),
+            # the same lookup in bid order (-price , created_at) , a backward scan of the index above
+            # would return the orders of a price level newest first
+            models.Index(
+                fields=['target_market', '-price', 'created_at'],
+                name='order_resting_bid_idx',
+                condition=models.Q(order_side='buy', order_state__in=['waiting', 'partially_filled'], remaining_amount__gt=0),
+                include=['amount', 'filled_amount', 'remaining_amount'],
+            ),
+            # keyset pages of the order list of a market (id < cursor) , newest first
+            models.Index(fields=['target_market', 'id'], name='order_market_id_idx'),
+        ]
+    
 
     
 class Trade(BaseModel):   
@@ -56,5 +78,41 @@ class Trade(BaseModel):
     def __str__(self):
         return f"{self.pk} : {self.maker.pk}/{self.taker.pk}"
     
+    class Meta:
+        # maker, taker and trade_market already get their foreign key indexes
+        indexes = [
+            models.Index(fields=['trade_market', 'created_at'], name='trade_market_created_idx'),
+            # keyset pages of the recent trades (id < cursor) , newest first
+            models.Index(fields=['trade_market', 'id'], name='trade_market_id_idx'),
+        ]
+    
 
     
+
+class Candle(models.Model):
+    # closed ohlcv bar of one market , open bars are kept in redis by the candle service (orders/candles.py)
+
+    class Interval(models.TextChoices):
+        ONE_MINUTE = '1m', '1 Minute'
+        FIVE_MINUTES = '5m', '5 Minutes'
+        ONE_HOUR = '1h', '1 Hour'
+        ONE_DAY = '1d', '1 Day'
+
+    market = models.ForeignKey('currencies.Market',on_delete=models.DO_NOTHING, related_name='market_candles')
+    interval = models.CharField(max_length=2, choices=Interval.choices)
+    open_time = models.DateTimeField()
+    open = models.DecimalField(max_digits=40, decimal_places=16)
+    high = models.DecimalField(max_digits=40, decimal_places=16)
+    low = models.DecimalField(max_digits=40, decimal_places=16)
+    close = models.DecimalField(max_digits=40, decimal_places=16)
+    volume = models.DecimalField(max_digits=40, decimal_places=8)
+    trades = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.market_id} {self.interval} {self.open_time}"
+
+    class Meta:
+        # one bar per market , interval and open time , the constraint index also serves the range reads
+        constraints = [
+            models.UniqueConstraint(fields=['market', 'interval', 'open_time'], name='candle_market_interval_time_uniq'),
+        ]
@@ -1,81 +1,464 @@
+import copy
 import redis
-import json
 import logging
+import threading
 from decimal import Decimal
+from django.conf import settings
 from django.db import transaction
 from django.utils import timezone
 from orders.models import Order, Trade
+from orders.book import BookEntry, MarketBook
+from orders.fixed import FixedPoint, DEFAULT_SCALE
+from orders.snapshots import EngineSnapshots
+from orders.candles import candle_service
+from orders.tickers import ticker_service
+from orders.tape import trade_tape
+from orders.status_cache import order_status_cache
+from orders.journal import CANCEL, AMEND, Journal, JournalReplay, encode_order, encode_cancel, encode_amend, encode_fill, encode_done, encode_checkpoint
 from orderbook.services import order_book_service
+from currencies.registry import market_registry
+from core.redis_pool import get_redis_client
 
 logger = logging.getLogger(__name__)
 
+ACTIVE_ORDER_STATES = [Order.OrderState.WAITING, Order.OrderState.PARTIALLY_FILLED]
+
+# makers locked per query when MATCHING_ROW_LOCKS is on
+LOCK_BATCH_SIZE = 50
+
 class MatchingEngine:
     
     def __init__(self):
-        self.redis_client = redis.Redis(host='localhost', port=6379, db=0, decode_responses=True)
+        self.redis_client = get_redis_client()
+        #in-memory books keyed by market id, seeded from postgres on first use
+        self.books = {}
+        #write-ahead journal of the matcher process (see attach_journal) , None in api processes
+        self.journal = None
+        #book deltas collected while process_orders runs a batch , per thread (see _batch_deltas)
+        self._batch = threading.local()
+        #set by the sharded matcher (run_matcher) , the only process writing its markets.
+        #any other process matches from postgres row locks , its in-memory book would miss the orders of the others
+        self.single_writer = False
         
+    @property
+    def _batch_deltas(self):
+        #the engine is shared by the worker threads of a process , a batch only collects the deltas of its own thread
+        return getattr(self._batch, 'deltas', None)
+    
+    @_batch_deltas.setter
+    def _batch_deltas(self, deltas):
+        self._batch.deltas = deltas
+    
     def process_order(self, order_id: int):
         """
         main process for all of orders 
         """
+        market_id = None
+        try:
+            with transaction.atomic():
+                # lock the taker so a duplicated command can not match it twice
+                order = Order.objects.select_for_update(of=('self',)).get(id=order_id)
+                market_id = order.target_market_id
+                return self._match_order(order)
+                    
+        except Order.DoesNotExist:
+            print(f"Order {order_id} not found")
+            return {"status": "error", "message": "Order not found"}
+        except Exception as e:
+            print(f"Error processing order {order_id}: {str(e)}")
+            #the transaction was rolled back, so drop the book and reseed it on next use
+            if market_id is not None:
+                self.books.pop(market_id, None)
+            return {"status": "error", "message": str(e)}
+    
+    def process_orders(self, order_ids):
+        """
+        match a batch of orders in arrival order in one transaction ,
+        the redis book gets one delta (and one stream event) per market for the whole batch.
+        returns the result of every order, in the order of the ids.
+        """
+        results = {}
+        self._batch_deltas = []
+        try:
+            with transaction.atomic():
+                orders = Order.objects.select_for_update(of=('self',)).in_bulk(order_ids)
+                for order_id in order_ids:
+                    order = orders.get(order_id)
+                    if order is None:
+                        results[order_id] = {"status": "error", "message": "Order not found"}
+                        continue
+                    mark = len(self._batch_deltas)
+                    try:
+                        #a savepoint per order , a failed order does not undo the rest of the batch
+                        with transaction.atomic():
+                            results[order_id] = self._match_order(order)
+                    except Exception as e:
+                        print(f"Error processing order {order_id}: {str(e)}")
+                        del self._batch_deltas[mark:]
+                        self.books.pop(order.target_market_id, None)
+                        results[order_id] = {"status": "error", "message": str(e)}
+                
+                deltas, self._batch_deltas = self._batch_deltas, None
+                self._flush_batch_deltas(deltas)
+        except Exception as e:
+            print(f"Error processing order batch: {str(e)}")
+            self.books.clear()
+            return [{"status": "error", "message": str(e)} for _ in order_ids]
+        finally:
+            self._batch_deltas = None
+        return [results[order_id] for order_id in order_ids]
+    
+    def cancel_order(self, order_id: int):
+        """
+        cancel a resting order and remove it from the books.
+        the row is locked and only its state is written , so fills committed by another worker are kept.
+        """
+        try:
+            with transaction.atomic():
+                order = Order.objects.select_for_update(of=('self',)).get(id=order_id)
+                if order.order_state not in ACTIVE_ORDER_STATES:
+                    return {"status": "error", "message": "Order cannot be canceled"}
+                
+                self._journal_now(encode_cancel(order))
+                order.order_state = Order.OrderState.CANCELED
+                order.save(update_fields=['order_state', 'updated_at'])
+                self._cache_order_status([order])
+                self._update_order_book(order)
+                self._journal_on_commit(encode_done(order, False))
+                return {"status": "canceled", "order_id": order.id}
+                
+        except Order.DoesNotExist:
+            print(f"Order {order_id} not found")
+            return {"status": "error", "message": "Order not found"}
+        except Exception as e:
+            print(f"Error canceling order {order_id}: {str(e)}")
+            return {"status": "error", "message": str(e)}
+    
+    def cancel_orders(self, market_id: int, order_ids=None, side: str = None):
+        """
+        cancel many resting orders of a market (the given ids , else every order of the market or of one side)
+        with one UPDATE and one redis book delta , so the book sequence moves once.
+        """
         try:
             with transaction.atomic():
-                order = Order.objects.get(id=order_id)
-                if order.order_state != Order.OrderState.WAITING:
-                    return {"status": "error", "message": "Order is not in waiting state"}
+                orders = Order.objects.select_for_update(of=('self',)).filter(
+                    target_market_id=market_id,
+                    order_state__in=ACTIVE_ORDER_STATES
+                )
+                if order_ids is not None:
+                    orders = orders.filter(id__in=order_ids)
+                if side:
+                    orders = orders.filter(order_side=side)
+                orders = list(orders.only(
+                    'id', 'target_market_id', 'order_type', 'order_side', 'price', 'amount', 'filled_amount', 'remaining_amount',
+                    'created_at', 'filled_at'
+                ))
+                if not orders:
+                    return {"status": "canceled", "order_ids": []}
                 
-                # calculate remaining_amount
-                order.remaining_amount = order.amount - (order.filled_amount or Decimal('0'))
-                order.save()
+                self._journal_now(*(encode_cancel(order) for order in orders))
+                now = timezone.now()
+                Order.objects.filter(id__in=[order.id for order in orders]).update(
+                    order_state=Order.OrderState.CANCELED,
+                    updated_at=now
+                )
                 
-                if order.order_type == Order.OrderType.MARKET:
-                    return self._process_market_order(order)
+                book = self.books.get(market_id)
+                for order in orders:
+                    order.order_state = Order.OrderState.CANCELED
+                    order.updated_at = now
+                    if book is not None:
+                        book.remove(order.id)
+                self._cache_order_status(orders)
+                
+                market_symbol = market_registry.get_by_id(market_id).symbol
+                self._send_order_book_delta(market_symbol, removed=[BookEntry.from_order(order, self._get_scale(market_id)) for order in orders])
+                self._journal_on_commit(*(encode_done(order, False) for order in orders))
+                return {"status": "canceled", "order_ids": [order.id for order in orders]}
+                
+        except Exception as e:
+            print(f"Error canceling orders of market {market_id}: {str(e)}")
+            self.books.pop(market_id, None)
+            return {"status": "error", "message": str(e)}
+    
+    def amend_order(self, order_id: int, price: Decimal = None, amount: Decimal = None):
+        """
+        change the price and/or amount of a resting limit order in place (cancel-replace in one command).
+        an amount decrease keeps the queue position , a price change or an amount increase requeues the order
+        (its created_at is the time priority) and a price that crosses the book is matched like a new limit order.
+        """
+        market_id = None
+        try:
+            with transaction.atomic():
+                order = Order.objects.select_for_update(of=('self',)).get(id=order_id)
+                market_id = order.target_market_id
+                if order.order_state not in ACTIVE_ORDER_STATES or order.order_type != Order.OrderType.LIMIT:
+                    return {"status": "error", "message": "Order cannot be amended"}
+                
+                filled_amount = order.filled_amount or Decimal('0')
+                price = order.price if price is None else price
+                amount = order.amount if amount is None else amount
+                if amount <= filled_amount:
+                    return {"status": "error", "message": "Amount must be greater than the filled amount"}
+                
+                requeue = price != order.price or amount > order.amount
+                order.price = price
+                order.amount = amount
+                order.remaining_amount = amount - filled_amount
+                if requeue:
+                    order.created_at = timezone.now()
+                self._journal_now(encode_amend(order))
+                
+                if requeue:
+                    # leave the book first , the order is matched again like a new taker
+                    book = self.books.get(market_id)
+                    if book is not None:
+                        book.remove(order.id)
+                    result = self._process_limit_order(order)
                 else:
-                    return self._process_limit_order(order)
-                    
+                    order.save()
+                    self._cache_order_status([order])
+                    self._update_order_book(order)
+                    result = {"status": "processed", "matched_amount": "0", "order_state": order.order_state}
+                
+                self._journal_on_commit(encode_done(order, self._is_resting(order)))
+                return dict(result, requeued=requeue)
+                
         except Order.DoesNotExist:
             print(f"Order {order_id} not found")
             return {"status": "error", "message": "Order not found"}
         except Exception as e:
-            print(f"Error processing order {order_id}: {str(e)}")
+            print(f"Error amending order {order_id}: {str(e)}")
+            if market_id is not None:
+                self.books.pop(market_id, None)
             return {"status": "error", "message": str(e)}
     
+    def get_book(self, market_id: int) -> MarketBook:
+        """
+        return the in-memory book of a market, seeding it from postgres the first time.
+        """
+        book = self.books.get(market_id)
+        if book is None:
+            book = self._load_book(market_id)
+            self.books[market_id] = book
+        return book
+    
+    def load_books(self, market_ids=None):
+        """
+        seed the in-memory books of the given markets,
+        or of every market that has resting orders (startup warm up).
+        """
+        if market_ids is None:
+            market_ids = Order.objects.filter(
+                order_state__in=ACTIVE_ORDER_STATES,
+                remaining_amount__gt=0
+            ).values_list('target_market_id', flat=True).distinct()
+        for market_id in market_ids:
+            self.books[market_id] = self._load_book(market_id)
+    
+    def _load_book(self, market_id: int) -> MarketBook:
+        """
+        build a market book from the active orders in postgres.
+        orders are inserted by creation time so every price level keeps its FIFO order.
+        """
+        scale = self._get_scale(market_id)
+        book = MarketBook(market_id, scale)
+        active_orders = Order.objects.filter(
+            target_market_id=market_id,
+            order_state__in=ACTIVE_ORDER_STATES,
+            remaining_amount__gt=0
+        ).only(
+            'id', 'order_side', 'price', 'amount', 'filled_amount', 'remaining_amount', 'created_at'
+        ).order_by('created_at', 'id')
+        for order in active_orders:
+            book.add(BookEntry.from_order(order, scale))
+        # a seeded book starts a new checkpoint of the market in the journal
+        self._journal_checkpoint(book)
+        return book
+    
+    def attach_journal(self, journal: Journal):
+        """
+        journal every command , fill and book seed of this process from now on.
+        the books already in memory are written as checkpoints first.
+        """
+        self.journal = journal
+        for book in self.books.values():
+            self._journal_checkpoint(book)
+    
+    def restore_books(self, journal: Journal, market_ids=None, snapshots: EngineSnapshots = None):
+        """
+        rebuild the in-memory and Redis books from the newest snapshot and the journal after it,
+        instead of postgres. a market with a command cut by a crash after its commit is reseeded from postgres.
+        returns the replay (records , offset , incomplete commands).
+        """
+        books, offset = snapshots.load_latest(self._get_scale) if snapshots is not None else ({}, 0)
+        books = {market_id: book.rescale(self._get_scale(market_id)) for market_id, book in books.items()}
+        replay = JournalReplay(books, self._get_scale).run(journal, offset)
+        books = {
+            market_id: book for market_id, book in replay.books.items()
+            if market_ids is None or market_id in market_ids
+        }
+        
+        if replay.incomplete:
+            rows = {
+                order_id: (state, price, amount)
+                for order_id, state, price, amount in Order.objects.filter(
+                    id__in=[order_id for _, order_id, _ in replay.incomplete]
+                ).values_list('id', 'order_state', 'price', 'amount')
+            }
+            for market_id, order_id, command in replay.incomplete:
+                state, price, amount = rows.get(order_id, (None, None, None))
+                if command == CANCEL:
+                    committed = state == Order.OrderState.CANCELED
+                elif command == AMEND:
+                    fields = replay.commands[order_id]
+                    committed = (price, amount) == (fields['price'], fields['amount'])
+                else:
+                    committed = state != Order.OrderState.WAITING
+                if committed:
+                    books.pop(market_id, None)
+        
+        for market_id, book in books.items():
+            self.books[market_id] = book
+            market = market_registry.get_by_id(market_id)
+            if market is not None:
+                order_book_service.replace_order_book(
+                    market.symbol, list(book.buy.iter_entries()) + list(book.sell.iter_entries())
+                )
+        return replay
+    
+    def write_snapshot(self, snapshots: EngineSnapshots):
+        """
+        snapshot every book at the current journal offset, then delete the journal segments
+        before the oldest snapshot kept (a restart never reads them).
+        must run between two commands (the matcher loop), never inside a transaction.
+        """
+        path = snapshots.write(self.books.values(), self.journal.offset)
+        self.journal.prune(snapshots.get_oldest_offset())
+        return path
+    
+    def _journal_now(self, *records):
+        if self.journal is not None:
+            self.journal.append(*records)
+    
+    def _journal_checkpoint(self, book: MarketBook):
+        if self.journal is not None:
+            self.journal.extend(encode_checkpoint(book))
+    
+    def _journal_on_commit(self, *records):
+        #results are journaled once postgres has them , a rolled back command leaves no trace
+        if self.journal is not None:
+            transaction.on_commit(lambda: self._journal_committed(records))
+    
+    def _journal_committed(self, records):
+        """
+        the command is committed whatever happens here , so a failed append is logged and not raised.
+        the journal then has the command without its DONE record , restore_books reseeds that market from postgres.
+        """
+        try:
+            self.journal.append(*records)
+        except Exception as e:
+            print(f"Error journaling committed records: {str(e)}")
+    
+    def sync_order(self, order: Order):
+        """
+        mirror an order row into the in-memory book if that book is loaded.
+        used for writes that happen outside the engine (admin, cancel api, tests).
+        """
+        book = self.books.get(order.target_market_id)
+        if book is None:
+            return
+        if self._is_resting(order):
+            book.upsert(BookEntry.from_order(order, book.scale))
+        else:
+            book.remove(order.id)
+    
+    def drop_order(self, order: Order):
+        """
+        remove a deleted order row from the in-memory book and the redis book.
+        """
+        book = self.books.get(order.target_market_id)
+        if book is not None:
+            book.remove(order.id)
+        if self._is_resting(order):
+            self._remove_from_order_book(order)
+    
+    def _is_resting(self, order: Order) -> bool:
+        return order.order_state in ACTIVE_ORDER_STATES and order.remaining_amount > 0
+    
+    def _match_order(self, order: Order):
+        """
+        match a locked taker , runs inside the transaction of the caller
+        """
+        if order.order_state != Order.OrderState.WAITING:
+            return {"status": "error", "message": "Order is not in waiting state"}
+        
+        # calculate remaining_amount (saved once with the match result)
+        order.remaining_amount = order.amount - (order.filled_amount or Decimal('0'))
+        
+        # journal the command before it changes anything
+        self._journal_now(encode_order(order))
+        
+        if order.order_type == Order.OrderType.MARKET:
+            result = self._process_market_order(order)
+        else:
+            result = self._process_limit_order(order)
+        
+        self._journal_on_commit(encode_done(order, self._is_resting(order)))
+        return result
+    
     def _process_market_order(self, order: Order):
         """
         process for market orders (order filled with best exist price in momment)
         """
-        matching_orders = self._find_matching_orders(order)
+        book = self._get_matching_book(order)
+        scale = book.scale if book is not None else self._get_scale(order.target_market_id)
+        makers = self._iter_makers(order, book, scale)
+        matching_order = next(makers, None)
         
-        if not matching_orders:
+        if matching_order is None:
             order.order_state = Order.OrderState.ERROR
             order.save()
+            self._cache_order_status([order])
             return {"status": "no_match", "message": "No matching orders found for market order"}
         
-        total_matched = Decimal('0')
+        # the match runs on integer lots , converted back once at the end
+        remaining = scale.to_lots(order.remaining_amount)
+        total_matched = 0
+        touched = []
+        trades = []
         
-        for matching_order in matching_orders:
-            if order.remaining_amount <= 0:
-                break
-                
-            matched_amount = min(order.remaining_amount, matching_order.remaining_amount)
+        while matching_order is not None:
+            matched_lots = min(remaining, matching_order.lots)
             
             #create trade
-            trade = self._create_trade(order, matching_order, matched_amount)
+            trades.append(self._create_trade(order, matching_order, matched_lots, scale))
       
-            # update orders amount
-            self._update_order_amounts(order, matching_order, matched_amount)
+            # update maker amount
+            self._update_order_amounts(matching_order, matched_lots, book)
+            touched.append(matching_order)
             
-            total_matched += matched_amount
+            remaining -= matched_lots
+            total_matched += matched_lots
+            if remaining <= 0:
+                break
+            matching_order = next(makers, None)
+        
+        # update taker amount
+        self._fill_taker(order, total_matched, scale)
+
+        # write every trade and maker change of this match at once
+        self._flush_fills(trades, touched)
 
         # update order state based on remaining price
         self._update_order_state(order)
 
         # update order book for display updated data
-        self._update_order_book(order)
+        self._update_order_book(order, touched, trades)
         
         return {
             "status": "processed",
-            "matched_amount": str(total_matched),
+            "matched_amount": format(scale.amount(total_matched).normalize(), 'f'),
             "order_state": order.order_state
         }
     
@@ -83,108 +466,234 @@ class MatchingEngine:
         """
         process for limit orders (execute when find a suitable order)
         """
-        matching_orders = self._find_matching_orders(order)
-        total_matched = Decimal('0')
-        for matching_order in matching_orders:
-            if order.remaining_amount <= 0:
+        book = self._get_matching_book(order)
+        scale = book.scale if book is not None else self._get_scale(order.target_market_id)
+        makers = self._iter_makers(order, book, scale)
+        # the match runs on integer ticks and lots , converted back once at the end
+        ticks = scale.to_ticks(order.price)
+        remaining = scale.to_lots(order.remaining_amount)
+        total_matched = 0
+        touched = []
+        trades = []
+        while remaining > 0:
+            matching_order = next(makers, None)
+            if matching_order is None:
                 break
                 
             # manage price for limit order
-            if not self._price_matches_limit_order(order, matching_order):
+            if not self._price_matches_limit_order(order, ticks, matching_order):
                 break
                 
-            matched_amount = min(order.remaining_amount, matching_order.remaining_amount)
+            matched_lots = min(remaining, matching_order.lots)
             
             # create trade
-            trade = self._create_trade(order, matching_order, matched_amount)
+            trades.append(self._create_trade(order, matching_order, matched_lots, scale))
             
-            # update order amount after trade
-            self._update_order_amounts(order, matching_order, matched_amount)
+            # update maker amount after trade
+            self._update_order_amounts(matching_order, matched_lots, book)
+            touched.append(matching_order)
             
-            total_matched += matched_amount
+            remaining -= matched_lots
+            total_matched += matched_lots
+        
+        # update taker amount
+        self._fill_taker(order, total_matched, scale)
+        
+        # write every trade and maker change of this match at once
+        self._flush_fills(trades, touched)
         
         # update order state after based on remaining price
         self._update_order_state(order)
         
         # include remaining amount to order book for future
         if order.remaining_amount > 0 and order.order_state in [Order.OrderState.WAITING, Order.OrderState.PARTIALLY_FILLED]:
-            self._add_to_order_book(order)
+            self._add_to_order_book(order, touched, trades)
         else:
-            self._update_order_book(order)
+            self._update_order_book(order, touched, trades)
         
         return {
             "status": "processed",
-            "matched_amount": str(total_matched),
+            "matched_amount": format(scale.amount(total_matched).normalize(), 'f'),
             "order_state": order.order_state
         }
     
-    def _find_matching_orders(self, order: Order):
+    def _get_matching_book(self, order: Order):
+        """
+        in-memory book of the order market, or None when makers are locked in postgres
+        (several workers match the same market, so no process holds the whole book).
+        only the single-writer matcher holds books , sync api replicas always lock the makers.
+        """
+        if settings.MATCHING_ROW_LOCKS or not self.single_writer:
+            # a loaded book would go stale while other workers fill its makers
+            self.books.pop(order.target_market_id, None)
+            return None
+        return self.get_book(order.target_market_id)
+    
+    def _get_scale(self, market_id: int) -> FixedPoint:
         """
-        fine suitable order from opposite type of order (buy/sell) for matching
+        fixed-point scale (tick size , lot size) of a market.
+        """
+        market = market_registry.get_by_id(market_id)
+        return market.scale if market is not None else DEFAULT_SCALE
+    
+    def _iter_makers(self, order: Order, book: MarketBook = None, scale: FixedPoint = DEFAULT_SCALE):
+        """
+        yield the makers of the opposite side in price-time priority.
+        a yielded maker stays first until it is filled and removed from the book.
+        """
+        if book is None:
+            yield from self._iter_locked_makers(order, scale)
+            return
+        
+        makers = book.opposite(order.order_side)
+        while True:
+            maker = makers.best()
+            if maker is None:
+                return
+            yield maker
+    
+    def _iter_locked_makers(self, order: Order, scale: FixedPoint = DEFAULT_SCALE):
+        """
+        walk the opposite side from postgres in price-time priority and lock every maker row,
+        rows locked by another worker are skipped instead of waited for.
         """
         opposite_side = Order.OrderSide.SELL if order.order_side == Order.OrderSide.BUY else Order.OrderSide.BUY
-        #order by price and creation time
         if opposite_side == Order.OrderSide.SELL:
-            # for buy ,sell with lowest price
-            order_by = ['price', 'created_at']
+            order_by = ['price', 'created_at', 'id']
         else:
-            # for sell ,buy with highest price
-            order_by = ['-price', 'created_at']
-        return Order.objects.filter(
-            target_market=order.target_market,
+            order_by = ['-price', 'created_at', 'id']
+        
+        makers = Order.objects.select_for_update(skip_locked=True).filter(
+            target_market_id=order.target_market_id,
             order_side=opposite_side,
-            order_state__in=[Order.OrderState.WAITING, Order.OrderState.PARTIALLY_FILLED],
+            order_state__in=ACTIVE_ORDER_STATES,
             remaining_amount__gt=0
-        ).order_by(*order_by)
+        )
+        if order.order_type == Order.OrderType.LIMIT:
+            # only fetch the rows the limit price can reach
+            if order.order_side == Order.OrderSide.BUY:
+                makers = makers.filter(price__lte=order.price)
+            else:
+                makers = makers.filter(price__gte=order.price)
+        
+        # fills are flushed at the end of the match, so consumed rows are excluded by id
+        seen = set()
+        while True:
+            batch = list(makers.exclude(id__in=seen).only(
+                'id', 'order_side', 'price', 'amount', 'filled_amount', 'remaining_amount', 'created_at'
+            ).order_by(*order_by)[:LOCK_BATCH_SIZE])
+            if not batch:
+                return
+            for maker in batch:
+                seen.add(maker.id)
+                yield BookEntry.from_order(maker, scale)
     
-    def _price_matches_limit_order(self, order: Order, matching_order: Order) -> bool:
+    def _price_matches_limit_order(self, order: Order, ticks: int, matching_order: BookEntry) -> bool:
         """
-        check order price for matching
+        check order price (in ticks) for matching
         """
         if order.order_side == Order.OrderSide.BUY:
             #the buyer is willing to buy up to their own price.
-            return matching_order.price <= order.price
+            return matching_order.ticks <= ticks
         else:
             #the seller is willing to sell at least for his own price.
-            return matching_order.price >= order.price
+            return matching_order.ticks >= ticks
     
-    def _create_trade(self, taker_order: Order, maker_order: Order, amount: Decimal):
+    def _create_trade(self, taker_order: Order, maker_order: BookEntry, lots: int, scale: FixedPoint):
        
         """
-        create a trade between two orders
+        build a trade between two orders , it is saved by _flush_fills
         """
 
         #trade price alwase is maker price (time priority)
-        trade_price = maker_order.price
+        trade_price = scale.price(maker_order.ticks)
         
-        trade = Trade.objects.create(
-            maker=maker_order,
+        # fee comes from the market registry , no lazy target_market fetch per trade
+        market = market_registry.get_by_id(taker_order.target_market_id)
+        trade = Trade(
+            maker_id=maker_order.id,
             taker=taker_order,
             price=trade_price,
-            amount=amount,
-            trade_market=taker_order.target_market,
-            fee=taker_order.target_market.fee
+            amount=scale.amount(lots),
+            trade_market_id=market.id,
+            fee=market.fee
         )
         
         return trade
     
-    def _update_order_amounts(self, taker_order: Order, maker_order: Order, matched_amount: Decimal):
+    def _update_order_amounts(self, maker_order: BookEntry, matched_lots: int, book: MarketBook):
+        """
+        update maker amount (integer lots) after matching , makers are written by _flush_fills.
+        """
+        maker_order.filled_lots += matched_lots
+        maker_order.lots -= matched_lots
+        
+        # drop filled makers from the book
+        if maker_order.lots <= 0 and book is not None:
+            book.remove(maker_order.id)
+    
+    def _fill_taker(self, taker_order: Order, matched_lots: int, scale: FixedPoint):
         """
-        update maker and taker amount after matching
+        convert the lots matched by the taker back to its amounts , it is saved once by _update_order_state.
         """
-        #update taker order
-        taker_order.filled_amount = (taker_order.filled_amount or Decimal('0')) + matched_amount
+        taker_order.filled_amount = (taker_order.filled_amount or Decimal('0')) + scale.amount(matched_lots)
         taker_order.remaining_amount = taker_order.amount - taker_order.filled_amount
+    
+    def _flush_fills(self, trades, makers):
+        """
+        persist the trades and maker changes of one taker match with one insert and one update,
+        instead of a round trip per fill.
+        """
+        if not trades:
+            return
         
-        #update maker order
-        maker_order.filled_amount = (maker_order.filled_amount or Decimal('0')) + matched_amount
-        maker_order.remaining_amount = maker_order.amount - maker_order.filled_amount
+        now = timezone.now()
+        maker_rows = []
+        for maker_order in makers:
+            filled = maker_order.lots <= 0
+            #only the last 5 fields are written , the others complete the status cache entry of the maker
+            maker_rows.append(Order(
+                id=maker_order.id,
+                target_market_id=trades[0].trade_market_id,
+                order_type=Order.OrderType.LIMIT,
+                order_side=maker_order.side,
+                price=maker_order.price,
+                amount=maker_order.amount,
+                created_at=maker_order.created_at,
+                filled_amount=maker_order.filled_amount,
+                remaining_amount=maker_order.remaining_amount,
+                order_state=Order.OrderState.FILLED if filled else Order.OrderState.PARTIALLY_FILLED,
+                filled_at=now if filled else None,
+                updated_at=now
+            ))
         
-        taker_order.save()
-        maker_order.save()
+        Trade.objects.bulk_create(trades)
+        Order.objects.bulk_update(maker_rows, ['filled_amount', 'remaining_amount', 'order_state', 'filled_at', 'updated_at'])
         
-        # update order state of maker order
-        self._update_order_state(maker_order)
+        self._journal_on_commit(*[
+            encode_fill(trade.trade_market_id, trade.taker_id, trade.maker_id, trade.price, trade.amount)
+            for trade in trades
+        ])
+        self._cache_order_status(maker_rows, trades)
+        #market data (candles , ticker , trade tape) moves only with committed trades
+        transaction.on_commit(lambda: self._record_trades(trades[0].trade_market_id, trades))
+    
+    def _record_trades(self, market_id: int, trades):
+        """
+        fold the committed trades of one match into the candles , the rolling ticker and the recent trades tape
+        of the market , all sent in one pipeline (one round trip).
+        """
+        try:
+            market_symbol = market_registry.get_by_id(market_id).symbol
+            pipe = self.redis_client.pipeline(transaction=False)
+            candle_service.queue_trades(pipe, market_symbol, trades)
+            ticker_service.queue_trades(pipe, market_symbol, trades)
+            trade_tape.queue_trades(pipe, market_symbol, trades)
+            closed_candles = pipe.execute()[0]
+            candle_service.flush(market_id, closed_candles)
+            
+        except Exception as e:
+            print(f"Error recording trades of market {market_id}: {str(e)}")
     
     def _update_order_state(self, order: Order):
         """
@@ -197,54 +706,40 @@ class MatchingEngine:
             order.order_state = Order.OrderState.PARTIALLY_FILLED
         
         order.save()
+        self._cache_order_status([order])
     
-    def _add_to_order_book(self, order: Order):
+    def _cache_order_status(self, orders, trades=()):
+        """
+        snapshot the changed orders now , the snapshots and the fills of the trades are written
+        to the order status cache once the transaction commits
+        """
+        snapshots = [order_status_cache.get_order_data(order) for order in orders]
+        transaction.on_commit(lambda: order_status_cache.update(snapshots, trades))
+    
+    def _add_to_order_book(self, order: Order, touched=(), trades=()):
         """
         append order to order book redis
         """
         try:
-            market_symbol = order.target_market.symbol
-            side = order.order_side
-            
-            order_data = {
-                'id': order.id,
-                'price': str(order.price),
-                'amount': str(order.remaining_amount),
-                'created_at': order.created_at.isoformat()
-            }
+            # keep the taker resting in the in-memory book
+            self.sync_order(order)
             
-            # create key for redis based on order date
-            redis_key = f"orderbook:{market_symbol}:{side}"
-            
-            # add to sorted set with score equal to price
-            if side == Order.OrderSide.BUY:
-                # for buy highest price is priorit (- is for Descending order)
-                score = float(-order.price)
-            else:
-                # for sell lowest price  is proprit
-                score = float(order.price)
-            
-            self.redis_client.zadd(redis_key, {json.dumps(order_data): score})
-            
-            # update order book service
-            order_book_service.update_order_book(market_symbol)
+            # write the taker and the makers it touched to redis in one delta
+            self._apply_order_book_delta(order, touched, trades)
             
         except Exception as e:
             print(f"Error adding order {order.id} to order book: {str(e)}")
     
-    def _update_order_book(self, order: Order):
+    def _update_order_book(self, order: Order, touched=(), trades=()):
         """
         update order book after  matching or canceling an order
         """
         try:
-            market_symbol = order.target_market.symbol
-            
-            # remove order from order book redis after fill or cancel
-            if order.order_state in [Order.OrderState.FILLED, Order.OrderState.CANCELED]:
-                self._remove_from_order_book(order)
+            # refresh or drop the order in the in-memory book
+            self.sync_order(order)
             
-            # update orderbook service after change
-            order_book_service.update_order_book(market_symbol)
+            # apply the order and the makers it touched to redis (fill, partial fill or cancel)
+            self._apply_order_book_delta(order, touched, trades)
             
         except Exception as e:
             print(f"Error updating order book for order {order.id}: {str(e)}")
@@ -254,26 +749,69 @@ class MatchingEngine:
         remove order from order book cache
         """
         try:
-            market_symbol = order.target_market.symbol
-            side = order.order_side
-            redis_key = f"orderbook:{market_symbol}:{side}"
-            
-            # find and remove order from sorted set
-            all_orders = self.redis_client.zrange(redis_key, 0, -1)
-            for order_json in all_orders:
-                order_data = json.loads(order_json)
-                if order_data['id'] == order.id:
-                    self.redis_client.zrem(redis_key, order_json)
-                    break
+            market_symbol = market_registry.get_by_id(order.target_market_id).symbol
+            self._send_order_book_delta(market_symbol, removed=[BookEntry.from_order(order, self._get_scale(order.target_market_id))])
                     
         except Exception as e:
             print(f"Error removing order {order.id} from order book: {str(e)}")
-
+    
+    def _apply_order_book_delta(self, order: Order, touched=(), trades=()):
+        """
+        split the taker and touched makers into resting and removed orders for the redis delta ,
+        the trades of the match are published with it as one stream event
+        """
+        resting = []
+        removed = []
+        (resting if self._is_resting(order) else removed).append(BookEntry.from_order(order, self._get_scale(order.target_market_id)))
+        for maker in touched:
+            (resting if maker.lots > 0 else removed).append(maker)
+        
+        market_symbol = market_registry.get_by_id(order.target_market_id).symbol
+        if self._batch_deltas is not None:
+            #inside process_orders , sent once for the whole batch
+            self._batch_deltas.append((market_symbol, resting, removed, trades))
+            return
+        self._send_order_book_delta(market_symbol, resting, removed, trades)
+    
+    def _send_order_book_delta(self, market_symbol: str, resting=(), removed=(), trades=()):
+        """
+        apply the redis book delta and publish its stream event (levels and trade prints) once the transaction commits ,
+        a rolled back match never reaches redis or the subscribers. the entries are copied now ,
+        the in-memory ones keep changing with the next commands.
+        """
+        resting = [copy.copy(entry) for entry in resting]
+        removed = [copy.copy(entry) for entry in removed]
+        transaction.on_commit(
+            lambda: order_book_service.update_order_book(market_symbol, resting=resting, removed=removed, trades=trades)
+        )
+    
+    def _flush_batch_deltas(self, deltas):
+        """
+        merge the deltas of a batch into one update per market ,
+        an order touched several times is sent with its last state only.
+        """
+        markets = {}
+        for market_symbol, resting, removed, trades in deltas:
+            entries, market_trades = markets.setdefault(market_symbol, ({}, []))
+            for entry in resting:
+                entries[entry.id] = (entry, True)
+            for entry in removed:
+                entries[entry.id] = (entry, False)
+            market_trades.extend(trades)
+        
+        for market_symbol, (entries, trades) in markets.items():
+            self._send_order_book_delta(
+                market_symbol,
+                resting=[entry for entry, is_resting in entries.values() if is_resting],
+                removed=[entry for entry, is_resting in entries.values() if not is_resting],
+                trades=trades
+            )
 
 """
 using singleton pattern
-This type of use of singleton must be executed on only one replica,
-otherwise it will cause race conditions, 
-but it is used due to the speed of the work.
+The in-memory books are only used by the single writer of a market:
+with ORDER_INGESTION_MODE='async' the api replicas only queue commands
+and `manage.py run_matcher` (single_writer) is the single process that calls it.
+In sync mode every replica matches from postgres row locks instead.
 """
 engine = MatchingEngine() 
\ No newline at end of file
@@ -0,0 +1,62 @@
+import hashlib
+from bisect import bisect
+from django.conf import settings
+from core.redis_pool import get_redis_client
+
+
+class ShardRouter:
+    """
+    assign every market symbol to one of N matcher shards with a consistent hash ring.
+    adding a market or a shard only moves the markets that hash next to it,
+    and every change bumps a version key so running workers rebalance.
+    """
+
+    version_key = 'matcher:shards:version'
+    virtual_nodes = 64
+
+    def __init__(self, shards: int = None):
+        self.redis_client = get_redis_client()
+        self.shards = shards or settings.MATCHER_SHARDS
+        self.ring = sorted(
+            (self._hash(f"shard-{shard}#{node}"), shard)
+            for shard in range(self.shards)
+            for node in range(self.virtual_nodes)
+        )
+        self.ring_keys = [key for key, _ in self.ring]
+
+    def shard_for(self, market_symbol: str) -> int:
+        """
+        owning shard of a market.
+        """
+        index = bisect(self.ring_keys, self._hash(market_symbol)) % len(self.ring)
+        return self.ring[index][1]
+
+    def markets_for_shard(self, shard: int, market_symbols) -> list:
+        return [symbol for symbol in market_symbols if self.shard_for(symbol) == shard]
+
+    def assign_market(self, market_symbol: str) -> int:
+        """
+        announce a new market, the owning worker picks it up on its next loop.
+        """
+        self.redis_client.incr(self.version_key)
+        return self.shard_for(market_symbol)
+
+    def lock_shard(self, shard: int):
+        """
+        lock of the single writer of a shard , a second matcher of the same shard (another host) waits for it.
+        the holder extends it on every loop , it expires MATCHER_LOCK_TIMEOUT seconds after the holder died.
+        """
+        return self.redis_client.lock(f"matcher:shards:{shard}:lock", timeout=settings.MATCHER_LOCK_TIMEOUT)
+
+    def get_version(self) -> int:
+        return int(self.redis_client.get(self.version_key) or 0)
+
+    def _hash(self, value: str) -> int:
+        #stable across processes, unlike the builtin hash()
+        return int(hashlib.md5(value.encode()).hexdigest()[:16], 16)
+
+
+"""
+using singleton pattern
+"""
+shard_router = ShardRouter()
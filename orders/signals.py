@@ -0,0 +1,15 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from orders.models import Order
+from orders.services import engine
+
+
+@receiver(post_save, sender=Order)
+def sync_order_to_engine_book(sender, instance, **kwargs):
+    #keep the in-memory book in line with rows written outside the engine
+    engine.sync_order(instance)
+
+
+@receiver(post_delete, sender=Order)
+def drop_order_from_engine_book(sender, instance, **kwargs):
+    engine.drop_order(instance)
@@ -0,0 +1,94 @@
+import os
+import struct
+import zlib
+from django.conf import settings
+from orders.journal import JournalReplay, encode_checkpoint, frame_records, scan_records, decode
+
+MAGIC = b'TCBOOK01'
+#magic , journal offset , number of markets , crc32 of the body
+HEADER = struct.Struct('<8sqII')
+
+
+class EngineSnapshots:
+    """
+    periodic binary snapshots of every in-memory book, with the journal offset they were taken at.
+    the body is the checkpoint records of the journal (RESET / REST) and is covered by a crc32,
+    a start loads the newest valid snapshot and replays the journal from its offset.
+    snapshots are only taken between two commands, so they never hold half a command.
+    """
+
+    suffix = '.snapshot'
+
+    def __init__(self, directory: str, keep: int = None):
+        self.directory = directory
+        self.keep = keep or settings.ENGINE_SNAPSHOTS_KEPT
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, books, journal_offset: int) -> str:
+        """
+        write a snapshot atomically (temp file + rename) and drop the oldest ones.
+        """
+        books = list(books)
+        payloads = []
+        for book in books:
+            payloads.extend(encode_checkpoint(book))
+        body = frame_records(payloads)
+
+        path = self._path(journal_offset)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'wb') as file:
+            file.write(HEADER.pack(MAGIC, journal_offset, len(books), zlib.crc32(body)))
+            file.write(body)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
+
+        for old_path in self._paths()[:-self.keep]:
+            os.remove(old_path)
+        return path
+
+    def get_oldest_offset(self) -> int:
+        """
+        journal offset of the oldest snapshot kept , a restart never replays the journal before it (0 if there is none).
+        """
+        paths = self._paths()
+        return int(os.path.basename(paths[0])[:-len(self.suffix)]) if paths else 0
+
+    def load_latest(self, scales=None):
+        """
+        (books, journal offset) of the newest snapshot with a valid checksum , ({}, 0) if there is none.
+        scales is market id -> fixed-point scale of the books , as in JournalReplay.
+        """
+        for path in reversed(self._paths()):
+            loaded = self.load(path, scales)
+            if loaded is not None:
+                return loaded
+            print(f"Skipping corrupted engine snapshot {path}")
+        return {}, 0
+
+    def load(self, path: str, scales=None):
+        with open(path, 'rb') as file:
+            data = file.read()
+        if len(data) < HEADER.size:
+            return None
+        magic, journal_offset, markets, checksum = HEADER.unpack_from(data)
+        body = data[HEADER.size:]
+        if magic != MAGIC or zlib.crc32(body) != checksum:
+            return None
+
+        replay = JournalReplay(scales=scales)
+        for _, payload in scan_records(body):
+            replay.apply(*decode(payload))
+        if len(replay.books) != markets:
+            return None
+        return replay.books, journal_offset
+
+    def _paths(self):
+        return [
+            os.path.join(self.directory, name)
+            for name in sorted(os.listdir(self.directory))
+            if name.endswith(self.suffix)
+        ]
+
+    def _path(self, journal_offset: int) -> str:
+        return os.path.join(self.directory, f"{journal_offset:020d}{self.suffix}")
@@ -0,0 +1,247 @@
+import json
+from decimal import Decimal
+from django.conf import settings
+from django.db.models import Q
+from orders.models import Order, Trade
+from currencies.registry import market_registry
+from core.redis_pool import get_redis_client
+
+OPEN_ORDER_STATES = [Order.OrderState.WAITING, Order.OrderState.PARTIALLY_FILLED]
+
+#hash fields of an order status , every value is a string ('' for an empty date)
+STATUS_FIELDS = (
+    'id', 'market_symbol', 'order_type', 'order_side', 'order_state', 'price', 'amount',
+    'filled_amount', 'remaining_amount', 'created_at', 'updated_at', 'filled_at'
+)
+
+#KEYS: order hash , fills list
+#ARGV: ttl (0 = open order , kept without expiry) , number of fills , the fills , then field / value pairs
+#writes an order read from postgres only if the engine has not written it meanwhile (a newer state wins)
+WARM_ORDER = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+local fills = tonumber(ARGV[2])
+redis.call('DEL', KEYS[2])
+for i = 3, 2 + fills do
+    redis.call('RPUSH', KEYS[2], ARGV[i])
+end
+redis.call('HSET', KEYS[1], unpack(ARGV, 3 + fills))
+if tonumber(ARGV[1]) > 0 then
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+    redis.call('EXPIRE', KEYS[2], ARGV[1])
+end
+return 1
+"""
+
+
+class OrderStatusCache:
+    """
+    order status (state , filled / remaining amounts , fills) in a redis hash per order ,
+    written by the matching engine after every committed state change , and the open orders of
+    every market in a sorted set by id. status polling reads redis , postgres only on a cache miss.
+    closed orders expire after ORDER_STATUS_TTL seconds.
+    """
+
+    def __init__(self):
+        self.redis_client = get_redis_client()
+        self.warm_script = self.redis_client.register_script(WARM_ORDER)
+
+    def get_order_data(self, order: Order):
+        """
+        snapshot of the status fields , taken when the engine changes the order.
+        """
+        return {
+            'id': str(order.id),
+            'market_symbol': market_registry.get_by_id(order.target_market_id).symbol,
+            'order_type': order.order_type,
+            'order_side': order.order_side,
+            'order_state': order.order_state,
+            'price': str(order.price),
+            'amount': str(order.amount),
+            'filled_amount': str(order.filled_amount or 0),
+            'remaining_amount': str(order.remaining_amount),
+            'created_at': order.created_at.isoformat() if order.created_at else '',
+            'updated_at': order.updated_at.isoformat() if order.updated_at else '',
+            'filled_at': order.filled_at.isoformat() if order.filled_at else ''
+        }
+
+    def get_fill_data(self, trade: Trade, role: str) -> str:
+        return json.dumps({
+            'trade_id': trade.id,
+            'price': str(trade.price),
+            'amount': str(trade.amount),
+            'role': role,
+            'timestamp': trade.created_at.isoformat() if trade.created_at else None
+        })
+
+    def update(self, orders, trades=()):
+        """
+        write the status of changed orders and append the fills of the trades , in one MULTI.
+        orders are get_order_data snapshots.
+        an order without a hash yet (created before the cache , or expired) gets its whole fills list ,
+        from postgres when it was filled before these trades , otherwise get_order would never show the older fills.
+        """
+        try:
+            new_fills = {}
+            for trade in trades:
+                for order_id, role in ((trade.taker_id, 'taker'), (trade.maker_id, 'maker')):
+                    new_fills.setdefault(str(order_id), []).append((trade.amount, self.get_fill_data(trade, role)))
+
+            pipe = self.redis_client.pipeline(transaction=False)
+            for data in orders:
+                pipe.exists(self._get_order_key(data['id']))
+            uncached = [data for data, exists in zip(orders, pipe.execute()) if not exists]
+            #the new fills are the whole list when they add up to the filled amount
+            filled_before = [
+                data['id'] for data in uncached
+                if Decimal(data['filled_amount']) != sum(amount for amount, _ in new_fills.get(data['id'], ()))
+            ]
+            seeded = {data['id']: [fill for _, fill in new_fills.pop(data['id'], ())] for data in uncached}
+            seeded.update(self._get_fills_from_db(filled_before))
+
+            pipe = self.redis_client.pipeline(transaction=True)
+            for order_id, fills in new_fills.items():
+                pipe.rpush(self._get_fills_key(order_id), *(fill for _, fill in fills))
+            for order_id, fills in seeded.items():
+                pipe.delete(self._get_fills_key(order_id))
+                if fills:
+                    pipe.rpush(self._get_fills_key(order_id), *fills)
+            for data in orders:
+                order_key = self._get_order_key(data['id'])
+                open_key = self._get_open_key(data['market_symbol'])
+                pipe.hset(order_key, mapping=data)
+                if self._is_open(data):
+                    pipe.zadd(open_key, {data['id']: int(data['id'])})
+                    pipe.persist(order_key)
+                    pipe.persist(self._get_fills_key(data['id']))
+                else:
+                    pipe.zrem(open_key, data['id'])
+                    pipe.expire(order_key, settings.ORDER_STATUS_TTL)
+                    pipe.expire(self._get_fills_key(data['id']), settings.ORDER_STATUS_TTL)
+            pipe.execute()
+
+        except Exception as e:
+            print(f"Error updating order status cache: {str(e)}")
+
+    def get_order(self, order_id: int):
+        """
+        status and fills of an order , one pipelined read , postgres only on a miss. None if the order does not exist.
+        """
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.hgetall(self._get_order_key(order_id))
+        pipe.lrange(self._get_fills_key(order_id), 0, -1)
+        data, fills = pipe.execute()
+        if not data:
+            order = Order.objects.filter(id=order_id).first()
+            if order is None:
+                return None
+            data = self.get_order_data(order)
+            fills = self._get_fills_from_db([order.id])[data['id']]
+            self._warm(data, fills)
+        return self._get_response_data(data, [json.loads(fill) for fill in fills])
+
+    def get_open_orders(self, market_symbol: str, limit: int, cursor: int = None):
+        """
+        open orders of a market , newest first , from the sorted set of the market (keyset on the order id).
+        the set is seeded from postgres on first use , members closed in between are dropped on read.
+        returns the orders and the cursor of the next page.
+        """
+        open_key = self._get_open_key(market_symbol)
+        if not self.redis_client.exists(self._get_synced_key(market_symbol)):
+            self._seed_open_orders(market_symbol)
+
+        ids = self.redis_client.zrevrangebyscore(
+            open_key, f"({cursor}" if cursor is not None else '+inf', '-inf', start=0, num=limit + 1
+        )
+        next_cursor = int(ids[limit - 1]) if len(ids) > limit else None
+        ids = ids[:limit]
+
+        pipe = self.redis_client.pipeline(transaction=False)
+        for order_id in ids:
+            pipe.hgetall(self._get_order_key(order_id))
+        cached = dict(zip(ids, pipe.execute()))
+
+        #the misses and their fills are read from postgres in two queries and written back
+        missing = [order_id for order_id, data in cached.items() if not data]
+        if missing:
+            fills = self._get_fills_from_db(missing)
+            for order in Order.objects.filter(id__in=missing):
+                data = self.get_order_data(order)
+                cached[data['id']] = data
+                self._warm(data, fills[data['id']])
+
+        orders = [data for data in cached.values() if data and self._is_open(data)]
+        closed = [order_id for order_id, data in cached.items() if not data or not self._is_open(data)]
+        if closed:
+            self.redis_client.zrem(open_key, *closed)
+        return [self._get_response_data(data) for data in orders], next_cursor
+
+    def _seed_open_orders(self, market_symbol: str):
+        #served by order_resting_idx
+        market = market_registry.get(market_symbol)
+        ids = list(Order.objects.filter(
+            target_market_id=market.id,
+            order_state__in=OPEN_ORDER_STATES,
+            remaining_amount__gt=0
+        ).values_list('id', flat=True))
+        pipe = self.redis_client.pipeline(transaction=True)
+        for chunk_start in range(0, len(ids), 1000):
+            pipe.zadd(self._get_open_key(market_symbol), {order_id: order_id for order_id in ids[chunk_start:chunk_start + 1000]})
+        pipe.set(self._get_synced_key(market_symbol), 1)
+        pipe.execute()
+
+    def _warm(self, data, fills):
+        try:
+            args = [0 if self._is_open(data) else settings.ORDER_STATUS_TTL, len(fills)] + list(fills)
+            for field, value in data.items():
+                args.extend([field, value])
+            self.warm_script(
+                keys=[self._get_order_key(data['id']), self._get_fills_key(data['id'])],
+                args=args,
+                client=self.redis_client
+            )
+        except Exception as e:
+            print(f"Error warming order status cache for order {data['id']}: {str(e)}")
+
+    def _get_fills_from_db(self, order_ids):
+        """
+        fills of the orders in one query , {order id (str): [fill json]}.
+        """
+        fills = {str(order_id): [] for order_id in order_ids}
+        if not fills:
+            return fills
+        trades = Trade.objects.filter(Q(maker_id__in=order_ids) | Q(taker_id__in=order_ids)).order_by('id')
+        for trade in trades:
+            for order_id, role in ((trade.taker_id, 'taker'), (trade.maker_id, 'maker')):
+                if str(order_id) in fills:
+                    fills[str(order_id)].append(self.get_fill_data(trade, role))
+        return fills
+
+    def _get_response_data(self, data, fills=None):
+        response = {field: data.get(field) or None for field in STATUS_FIELDS}
+        response['id'] = int(data['id'])
+        if fills is not None:
+            response['fills'] = fills
+        return response
+
+    def _is_open(self, data) -> bool:
+        return data['order_state'] in OPEN_ORDER_STATES and Decimal(data['remaining_amount']) > 0
+
+    def _get_order_key(self, order_id) -> str:
+        return f"order:{order_id}"
+
+    def _get_fills_key(self, order_id) -> str:
+        return f"order:{order_id}:fills"
+
+    def _get_open_key(self, market_symbol: str) -> str:
+        return f"orders:open:{market_symbol}"
+
+    def _get_synced_key(self, market_symbol: str) -> str:
+        return f"orders:open:{market_symbol}:synced"
+
+
+"""
+using singleton pattern
+"""
+order_status_cache = OrderStatusCache()
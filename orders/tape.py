@@ -0,0 +1,62 @@
+import json
+from django.conf import settings
+from orders.models import Trade
+from currencies.registry import market_registry
+from orderbook.services import order_book_service
+from core.redis_pool import get_redis_client
+
+
+class TradeTape:
+    """
+    recent trades of every market , newest first , in a redis list capped at TRADE_TAPE_SIZE.
+    the engine appends the trades of a match in the same pipeline as the candles and the ticker ,
+    the last N trades are one LRANGE , deeper history is a keyset page on Trade (see RecentTradesView).
+    """
+
+    def __init__(self):
+        self.redis_client = get_redis_client()
+
+    def queue_trades(self, client, market_symbol: str, trades):
+        """
+        queue the append and the trim of the tape on client (a pipeline).
+        """
+        tape_key = self._get_tape_key(market_symbol)
+        #LPUSH of oldest to newest leaves the newest trade at the head
+        client.lpush(tape_key, *[json.dumps(order_book_service._get_trade_data(trade)) for trade in trades])
+        client.ltrim(tape_key, 0, settings.TRADE_TAPE_SIZE - 1)
+
+    def get_recent_trades(self, market_symbol: str, limit: int):
+        """
+        the last limit trades of the tape , newest first (empty if the tape is empty or redis is down).
+        """
+        try:
+            return [json.loads(trade) for trade in self.redis_client.lrange(self._get_tape_key(market_symbol), 0, limit - 1)]
+        except Exception as e:
+            print(f"Error reading trade tape of {market_symbol}: {str(e)}")
+            return []
+
+    def get_trade_rows(self, market_symbol: str):
+        """
+        trades of the market for the keyset pages of deeper history (trade_market_id_idx).
+        """
+        market = market_registry.get(market_symbol)
+        return Trade.objects.filter(trade_market_id=market.id).values('id', 'price', 'amount', 'taker__order_side', 'created_at')
+
+    def get_row_data(self, row):
+        #same fields as the tape entries
+        return {
+            'id': row['id'],
+            'price': float(row['price']),
+            'amount': float(row['amount']),
+            'side': row['taker__order_side'],
+            'timestamp': row['created_at'].isoformat() if row['created_at'] else None
+        }
+
+    def _get_tape_key(self, market_symbol: str) -> str:
+        return f"trades:{market_symbol}"
+
+
+"""
+using singleton pattern
+"""
+trade_tape = TradeTape()
@@ -0,0 +1,264 @@
+import json
+from decimal import Decimal
+from django.utils import timezone
+from currencies.registry import market_registry
+from orderbook.services import TICKERS_KEY, order_book_service
+from core.redis_pool import get_redis_client
+
+#minutes of the rolling window of the ticker statistics (24h)
+WINDOW_MINUTES = 1440
+
+VOLUME_UNITS = Decimal('100000000')
+
+#KEYS: minute buckets hash , bucket minutes list (oldest first) , window totals hash , ticker hash , bucket volumes hash
+#ARGV: market symbol , current minute , window minutes , then 3 values per trade: minute , price , units of 1e-8
+#a bucket is {o, h, l, c, n} of one minute and its volume is an integer counter of the volumes hash ,
+#the totals keep the window volume / trade count and its high / low. every volume moves with HINCRBY (exact integers ,
+#never a lua double). every call first drops the buckets that left the window , so a trade costs O(1)
+#and only an expired high or low scans the (at most WINDOW_MINUTES) remaining buckets.
+#the statistics are written to the market field of the ticker hash and returned.
+ROLL_TICKER = """
+local buckets, minutes, totals, volumes = KEYS[1], KEYS[2], KEYS[3], KEYS[5]
+local now, size = tonumber(ARGV[2]), tonumber(ARGV[3])
+local window = redis.call('HMGET', totals, 'high', 'low', 'last')
+local high, low, last = window[1], window[2], window[3]
+local recompute = false
+
+-- negate an integer units string (exact , HINCRBY parses it)
+local function negate(units)
+    if string.sub(units, 1, 1) == '-' then
+        return string.sub(units, 2)
+    end
+    return '-' .. units
+end
+
+-- drop the buckets that left the window
+while true do
+    local oldest = redis.call('LINDEX', minutes, 0)
+    if not oldest or tonumber(oldest) > now - size then
+        break
+    end
+    redis.call('LPOP', minutes)
+    local raw = redis.call('HGET', buckets, oldest)
+    if raw then
+        local bucket = cjson.decode(raw)
+        -- buckets written before the volumes hash keep their volume in v
+        local units = redis.call('HGET', volumes, oldest) or bucket.v or '0'
+        redis.call('HDEL', buckets, oldest)
+        redis.call('HDEL', volumes, oldest)
+        redis.call('HINCRBY', totals, 'volume', negate(units))
+        redis.call('HINCRBY', totals, 'trades', -bucket.n)
+        -- numeric comparison , the same price can be written as '100' and '100.0'
+        if not high or tonumber(bucket.h) >= tonumber(high) or tonumber(bucket.l) <= tonumber(low) then
+            recompute = true
+        end
+    end
+end
+
+if recompute then
+    high, low = false, false
+    for _, raw in ipairs(redis.call('HVALS', buckets)) do
+        local bucket = cjson.decode(raw)
+        if not high or tonumber(bucket.h) > tonumber(high) then
+            high = bucket.h
+        end
+        if not low or tonumber(bucket.l) < tonumber(low) then
+            low = bucket.l
+        end
+    end
+end
+
+for i = 4, #ARGV, 3 do
+    local minute, price, units = ARGV[i], ARGV[i + 1], ARGV[i + 2]
+    if tonumber(minute) > now - size then
+        local raw = redis.call('HGET', buckets, minute)
+        local bucket
+        if raw then
+            bucket = cjson.decode(raw)
+            if tonumber(price) > tonumber(bucket.h) then
+                bucket.h = price
+            end
+            if tonumber(price) < tonumber(bucket.l) then
+                bucket.l = price
+            end
+            bucket.c = price
+            bucket.n = bucket.n + 1
+            if bucket.v then
+                redis.call('HINCRBY', volumes, minute, bucket.v)
+                bucket.v = nil
+            end
+        else
+            bucket = {o = price, h = price, l = price, c = price, n = 1}
+            local newest = redis.call('LINDEX', minutes, -1)
+            if not newest or tonumber(newest) < tonumber(minute) then
+                redis.call('RPUSH', minutes, minute)
+            else
+                -- a late trade of an older minute is inserted before the first newer minute , the list stays in order
+                for _, member in ipairs(redis.call('LRANGE', minutes, 0, -1)) do
+                    if tonumber(member) > tonumber(minute) then
+                        redis.call('LINSERT', minutes, 'BEFORE', member, minute)
+                        break
+                    end
+                end
+            end
+        end
+        redis.call('HSET', buckets, minute, cjson.encode(bucket))
+        redis.call('HINCRBY', volumes, minute, units)
+        redis.call('HINCRBY', totals, 'volume', units)
+        redis.call('HINCRBY', totals, 'trades', 1)
+        if not high or tonumber(price) > tonumber(high) then
+            high = price
+        end
+        if not low or tonumber(price) < tonumber(low) then
+            low = price
+        end
+        last = price
+    end
+end
+
+if high then
+    redis.call('HSET', totals, 'high', high, 'low', low)
+else
+    redis.call('HDEL', totals, 'high', 'low')
+end
+if last then
+    redis.call('HSET', totals, 'last', last)
+end
+
+local open = false
+local oldest = redis.call('LINDEX', minutes, 0)
+if oldest then
+    open = cjson.decode(redis.call('HGET', buckets, oldest)).o
+end
+local counters = redis.call('HMGET', totals, 'volume', 'trades')
+local ticker = cjson.encode({
+    last = last or false, open = open, high = high or false, low = low or false,
+    volume = counters[1] or '0', trades = tonumber(counters[2] or 0), minute = now
+})
+redis.call('HSET', KEYS[4], ARGV[1], ticker)
+return ticker
+"""
+
+
+class TickerService:
+    """
+    rolling 24h ticker of every market (last price , best bid / ask , open , high , low , volume , change).
+    the trades of the engine are folded into per-minute buckets by one Lua script per match ,
+    the statistics and the top of book (written by the order book scripts) are fields of one hash ,
+    so a ticker or the tickers of all markets are served by a single hash read.
+    """
+
+    def __init__(self):
+        self.redis_client = get_redis_client()
+        self.roll_script = self.redis_client.register_script(ROLL_TICKER)
+
+    def add_trades(self, market_id: int, trades):
+        """
+        fold the trades of one match into the rolling window of the market.
+        """
+        if not trades:
+            return
+
+        try:
+            self.queue_trades(self.redis_client, market_registry.get_by_id(market_id).symbol, trades)
+
+        except Exception as e:
+            print(f"Error adding trades to ticker of market {market_id}: {str(e)}")
+
+    def queue_trades(self, client, market_symbol: str, trades):
+        """
+        run (or queue on client when it is a pipeline) the script call folding the trades.
+        """
+        trade_args = []
+        for trade in trades:
+            trade_args.extend([int(trade.created_at.timestamp()) // 60, format(trade.price, 'f'), self._to_units(trade.amount)])
+        return self._roll(client, market_symbol, trade_args)
+
+    def get_ticker(self, market_symbol: str):
+        """
+        ticker of one market , one HMGET of its statistics and top of book fields.
+        """
+        stats, top = self.redis_client.hmget(TICKERS_KEY, market_symbol, self._get_top_field(market_symbol))
+        stats = self._refresh_stale({market_symbol: stats})[market_symbol]
+        return self._get_ticker_data(market_symbol, stats, top)
+
+    def get_tickers(self):
+        """
+        tickers of every market , one HGETALL of the ticker hash.
+        """
+        fields = self.redis_client.hgetall(TICKERS_KEY)
+        symbols = [market.symbol for market in market_registry.all()]
+        stats = self._refresh_stale({symbol: fields.get(symbol) for symbol in symbols})
+        return [
+            self._get_ticker_data(symbol, stats[symbol], fields.get(self._get_top_field(symbol)))
+            for symbol in symbols
+        ]
+
+    def _refresh_stale(self, stats):
+        """
+        a market without trades since the last minute still has buckets to expire ,
+        it is rolled forward by its first reader (one pipelined script call per stale market).
+        """
+        now = self._get_minute()
+        stats = {symbol: json.loads(value) if value else None for symbol, value in stats.items()}
+        stale = [symbol for symbol, value in stats.items() if value is not None and value['minute'] < now]
+        if stale:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for symbol in stale:
+                self._roll(pipe, symbol, [], now)
+            for symbol, value in zip(stale, pipe.execute()):
+                stats[symbol] = json.loads(value)
+        return stats
+
+    def _roll(self, client, market_symbol: str, trade_args, now: int = None):
+        return self.roll_script(
+            keys=[
+                f"ticker:{market_symbol}:buckets", f"ticker:{market_symbol}:minutes",
+                f"ticker:{market_symbol}:totals", TICKERS_KEY, f"ticker:{market_symbol}:volumes"
+            ],
+            args=[market_symbol, now if now is not None else self._get_minute(), WINDOW_MINUTES] + trade_args,
+            client=client
+        )
+
+    def _get_ticker_data(self, market_symbol: str, stats, top):
+        stats = stats or {}
+        top = json.loads(top) if top else {}
+        last = self._to_float(stats.get('last'))
+        open_price = self._to_float(stats.get('open'))
+        change = last - open_price if last is not None and open_price is not None else None
+        return {
+            "market_symbol": market_symbol,
+            "last_price": last,
+            "best_bid": self._to_float(top.get('bid')),
+            "best_ask": self._to_float(top.get('ask')),
+            "open_price": open_price,
+            "high": self._to_float(stats.get('high')),
+            "low": self._to_float(stats.get('low')),
+            "volume": float(self._from_units(stats.get('volume') or 0)),
+            "trades": stats.get('trades', 0),
+            "price_change": change,
+            "price_change_percent": change / open_price * 100 if change is not None and open_price else None
+        }
+
+    def _get_top_field(self, market_symbol: str) -> str:
+        #written by the order book scripts
+        return order_book_service._get_top_field(market_symbol)
+
+    def _get_minute(self) -> int:
+        return int(timezone.now().timestamp()) // 60
+
+    def _to_float(self, value):
+        #json false / missing field -> None
+        return float(value) if value else None
+
+    def _to_units(self, amount: Decimal) -> int:
+        return int(amount * VOLUME_UNITS)
+
+    def _from_units(self, units) -> Decimal:
+        return Decimal(int(units)) / VOLUME_UNITS
+
+
+"""
+using singleton pattern
+"""
+ticker_service = TickerService()